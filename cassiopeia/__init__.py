@@ -37,7 +37,14 @@ from .cassiopeia import (
     get_paginated_league_entries,
     get_verification_string,
 )
-from .cassiopeia import apply_settings, set_riot_api_key, print_calls, _get_pipeline
+from .cassiopeia import (
+    apply_settings,
+    set_riot_api_key,
+    print_calls,
+    request_priority,
+    cache_stats,
+    _get_pipeline,
+)
 from .core import (
     Champion,
     Champions,
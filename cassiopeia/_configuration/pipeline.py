@@ -0,0 +1,465 @@
+from typing import (
+    TypeVar,
+    Type,
+    Mapping,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Callable,
+    Tuple,
+    Generator,
+)
+from collections import deque
+from contextvars import ContextVar
+from copy import deepcopy
+from threading import Event, Lock
+
+from datapipelines import (
+    DataPipeline,
+    DataSink,
+    DataSource,
+    NotFoundError,
+    NoConversionError,
+    PipelineContext,
+    TYPE_WILDCARD,
+)
+
+from ..common import _freeze, _identifiers_key
+from ..tracing import span
+
+T = TypeVar("T")
+
+
+def _in_requested_order(
+    items: Iterable[T], key: str, identifiers: List[Any]
+) -> Iterator[T]:
+    """Yields the results of a `get_many` query in the order of its identifiers.
+
+    Sources may return them in any order (e.g. the Riot API's matches with `ordered_results` off), so each result is
+    matched to its identifier by the attribute the query's key is named after (`id` for `ids`, `puuid` for `puuids`).
+    Results that can't be matched take the place of the next identifier, in the order they arrived.
+    """
+    attribute = key[:-1] if key.endswith("s") else key
+    wanted = set(identifiers)
+    arrived = {}
+    unmatched = deque()
+    items = iter(items)
+    for identifier in identifiers:
+        while identifier not in arrived and not unmatched:
+            item = next(items, None)
+            if item is None:
+                break
+            try:
+                found = getattr(item, attribute, None)
+                matched = found in wanted and found not in arrived
+            except TypeError:  # Unhashable
+                matched = False
+            if matched:
+                arrived[found] = item
+            else:
+                unmatched.append(item)
+        if identifier in arrived:
+            yield arrived.pop(identifier)
+        elif unmatched:
+            yield unmatched.popleft()
+        else:
+            raise NotFoundError(
+                "A source returned fewer results than were requested!"
+            )
+
+
+def _merge(cached: List[T], missing: Iterator[T]) -> Iterator[T]:
+    for item in cached:
+        if item is None:
+            item = next(missing, None)
+            if item is None:
+                raise NotFoundError(
+                    "A source returned fewer results than were requested!"
+                )
+        yield item
+
+
+def _copy_error(error: BaseException) -> BaseException:
+    # Errors' __init__ arguments don't always match their args, so the copy is made without calling it
+    copy = error.__class__.__new__(error.__class__, *error.args)
+    copy.__dict__.update(getattr(error, "__dict__", {}))
+    return copy
+
+
+# The keys of the `get`s that the current context is making. Threads that are handed a copy of the context (by
+# cassiopeia.aio or MatchAPI's concurrent get_many) count as the same request, so they don't wait for it.
+_leading = ContextVar("cassiopeia_leading_requests", default=frozenset())
+
+
+class _Call(object):
+    """A `get` that is in flight, whose result is shared with the threads that make the same request meanwhile."""
+
+    __slots__ = ["done", "result", "error"]
+
+    def __init__(self):
+        self.done = None  # Created by the first thread that waits for the result
+        self.result = None
+        self.error = None
+
+
+class _SinkRoute(object):
+    """Puts objects of one type into a data sink, transformed into a type the sink accepts."""
+
+    __slots__ = ["sink", "store_type", "transform"]
+
+    def __init__(self, sink: DataSink, store_type: type, transform: Callable) -> None:
+        self.sink = sink
+        self.store_type = store_type
+        self.transform = transform
+
+    def put(self, item: Any, context: PipelineContext) -> None:
+        with span(
+            "sink", sink=self.sink.__class__.__name__, type=self.store_type.__name__
+        ):
+            self.sink.put(
+                self.store_type, self.transform(data=item, context=context), context
+            )
+
+    def put_many(self, items: Iterable[Any], context: PipelineContext) -> None:
+        transform = self.transform
+        with span(
+            "sink", sink=self.sink.__class__.__name__, type=self.store_type.__name__
+        ):
+            self.sink.put_many(
+                self.store_type,
+                (transform(data=item, context=context) for item in items),
+                context,
+            )
+
+
+class _SourceRoute(object):
+    """Gets objects of one type from a data source: the type the source is asked for, the transformer chain to the
+    requested type, and the sinks the result is put into before and after it's transformed.
+    """
+
+    __slots__ = ["source", "source_type", "type", "transform", "before", "after"]
+
+    def __init__(
+        self,
+        source: DataSource,
+        source_type: type,
+        type: type,
+        transform: Callable,
+        before: Tuple[_SinkRoute, ...],
+        after: Tuple[_SinkRoute, ...],
+    ) -> None:
+        self.source = source
+        self.source_type = source_type
+        self.type = type
+        self.transform = transform
+        self.before = before
+        self.after = after
+
+    def _source_span(self):
+        return span(
+            "source",
+            source=self.source.__class__.__name__,
+            type=self.source_type.__name__,
+        )
+
+    def _transform_span(self):
+        return span(
+            "transform", source=self.source_type.__name__, target=self.type.__name__
+        )
+
+    def get(self, query: Mapping[str, Any], context: PipelineContext) -> Any:
+        with self._source_span():
+            result = self.source.get(self.source_type, deepcopy(query), context)
+        for sink in self.before:
+            sink.put(result, context)
+        if self.source_type is not self.type:
+            with self._transform_span():
+                result = self.transform(data=result, context=context)
+        for sink in self.after:
+            sink.put(result, context)
+        return result
+
+    def get_many(
+        self, query: Mapping[str, Any], context: PipelineContext, streaming: bool
+    ) -> Iterable[Any]:
+        with self._source_span():
+            results = self.source.get_many(self.source_type, deepcopy(query), context)
+            if streaming:
+                return self._stream(results, context)
+            results = list(results)
+        for sink in self.before:
+            sink.put_many(results, context)
+        if self.source_type is not self.type:
+            with self._transform_span():
+                results = [
+                    self.transform(data=result, context=context) for result in results
+                ]
+        for sink in self.after:
+            sink.put_many(results, context)
+        return results
+
+    def _stream(
+        self, results: Iterable[Any], context: PipelineContext
+    ) -> Generator[Any, None, None]:
+        # Spans are closed before each yield, so they don't include the time the caller takes with a result
+        for result in results:
+            for sink in self.before:
+                sink.put(result, context)
+            if self.source_type is not self.type:
+                with self._transform_span():
+                    result = self.transform(data=result, context=context)
+            for sink in self.after:
+                sink.put(result, context)
+            yield result
+
+
+# The parts of datapipelines' DataPipeline that the routes are built from. They aren't part of its public API, so
+# if a version of datapipelines doesn't have them, the stock DataPipeline methods are used instead.
+_PIPELINE_INTERNALS = (
+    "_get_handlers",
+    "_put_handlers",
+    "_type_graph",
+    "_sources",
+    "_sinks",
+    "_new_context",
+)
+
+
+def _sink_route(handler: Any) -> _SinkRoute:
+    return _SinkRoute(handler._sink, handler._store_type, handler._transform)
+
+
+def _source_route(handler: Any, type: type) -> _SourceRoute:
+    return _SourceRoute(
+        handler._source,
+        handler._source_type,
+        type,
+        handler._transform,
+        tuple(_sink_route(sink) for sink in handler._before_transform),
+        tuple(_sink_route(sink) for sink in handler._after_transform),
+    )
+
+
+class CassiopeiaPipeline(DataPipeline):
+    """The data pipeline, which lets the cache answer as much of a query as it can.
+
+    Queries that recently weren't found anywhere are answered from the cache, and only the items of a `get_many`
+    query that aren't cached are requested from the other data sources.
+
+    A thread that makes the same `get` request as another thread that is still waiting for its result waits for and
+    shares that result, instead of requesting it again.
+
+    The data sources that can provide each type, the transformers from the type they provide, and the data sinks the
+    results are put into are worked out once per type (by `precompute_routes`, or when the type is first used), and
+    nothing is logged per request.
+    """
+
+    _cache = None
+    # The number of seconds a thread waits for an identical request before it makes the request itself
+    identical_request_timeout = 60.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._calls = {}  # (type, frozen query) -> _Call
+        self._calls_lock = Lock()
+        self._source_routes = {}  # type -> Tuple[_SourceRoute, ...], or None if no source provides it
+        self._sink_routes = {}  # type -> Tuple[_SinkRoute, ...]
+        self._use_routes = all(hasattr(self, name) for name in _PIPELINE_INTERNALS)
+
+    def precompute_routes(self, types: Iterable[type] = None) -> None:
+        """Works out how to get and put each of `types` (by default, every type a data source, sink, or transformer
+        knows about) so that it isn't done when one is first requested.
+        """
+        if not self._use_routes:
+            return
+        if types is None:
+            types = set(self._type_graph.nodes)
+            for source, _ in self._sources:
+                types.update(source.provides)
+            for sink in self._sinks:
+                types.update(sink.accepts)
+            types.discard(TYPE_WILDCARD)
+        for type in types:
+            try:
+                self._routes(self._source_routes_for, type)
+            except NoConversionError:
+                pass  # Remembered, so requests for it fail right away
+            self._routes(self._sink_routes_for, type)
+
+    def _routes(self, routes_for: Callable[[type], T], type: type) -> T:
+        # None if the routes can't be built from the handlers of this version of datapipelines
+        if self._use_routes:
+            try:
+                return routes_for(type)
+            except AttributeError:
+                self._use_routes = False
+        return None
+
+    def _source_routes_for(self, type: Type[T]) -> Tuple[_SourceRoute, ...]:
+        try:
+            routes = self._source_routes[type]
+        except KeyError:
+            try:
+                routes = tuple(
+                    _source_route(handler, type)
+                    for handler in self._get_handlers(type)
+                )
+            except NoConversionError:
+                routes = None
+            self._source_routes[type] = routes
+        if routes is None:
+            raise NoConversionError(
+                'No source can provide "{type}"'.format(type=type.__name__)
+            )
+        return routes
+
+    def _sink_routes_for(self, type: Type[T]) -> Tuple[_SinkRoute, ...]:
+        try:
+            return self._sink_routes[type]
+        except KeyError:
+            try:
+                routes = tuple(
+                    _sink_route(handler) for handler in self._put_handlers(type)
+                )
+            except NoConversionError:
+                routes = ()
+            self._sink_routes[type] = routes
+            return routes
+
+    def get(self, type: Type[T], query: Mapping[str, Any]) -> T:
+        with span("get", type=type.__name__):
+            cache = self._cache
+            if cache is not None and cache.is_revalidating(type):
+                # Threads that are served the stale object shouldn't wait for its replacement
+                return self._get(type, query)
+            try:
+                key = (type, _freeze(query))
+                hash(key)
+            except TypeError:
+                return self._get(type, query)
+            return self._single_flight(key, lambda: self._get(type, query))
+
+    def _single_flight(self, key: Any, get: Callable[[], T]) -> T:
+        leading = _leading.get()
+        if key in leading:
+            return get()  # The request is made again while it's being made, e.g. by a transformer
+        with self._calls_lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            elif call.done is None:
+                call.done = Event()
+        if not leader:
+            with span("wait_for_identical_request"):
+                done = call.done.wait(self.identical_request_timeout)
+            if not done:
+                return get()
+            if call.error is not None:
+                # A copy, so the tracebacks of the threads that share the error aren't added to one another
+                raise _copy_error(call.error) from call.error
+            return call.result
+
+        token = _leading.set(leading | {key})
+        try:
+            call.result = get()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            _leading.reset(token)
+            with self._calls_lock:
+                del self._calls[key]
+            if call.done is not None:
+                call.done.set()
+
+    def _get(self, type: Type[T], query: Mapping[str, Any]) -> T:
+        cache = self._cache
+        if cache is None:
+            return self._fetch(type, query)
+
+        cache.check_not_found(type, query)  # Raises NotFoundError
+        try:
+            return self._fetch(type, query)
+        except NotFoundError:
+            cache.put_not_found(type, query)
+            raise
+
+    def get_many(
+        self, type: Type[T], query: Mapping[str, Any], streaming: bool = False
+    ) -> Iterable[T]:
+        with span("get_many", type=type.__name__):
+            return self._get_many(type, query, streaming)
+
+    def _get_many(
+        self, type: Type[T], query: Mapping[str, Any], streaming: bool
+    ) -> Iterable[T]:
+        cache = self._cache
+        key = _identifiers_key(query) if cache is not None else None
+        if key is None:
+            return self._fetch_many(type, query, streaming)
+
+        query = dict(query)
+        query[key] = list(query[key])
+        cached = cache.get_many_cached(type, query)
+        if cached is None or all(item is None for item in cached):
+            return self._fetch_many(type, query, streaming)
+
+        missing = [
+            identifier
+            for identifier, item in zip(query[key], cached)
+            if item is None
+        ]
+        if missing:
+            query[key] = missing
+            results = self._fetch_many(type, query, streaming)
+            results = _merge(cached, _in_requested_order(results, key, missing))
+        else:
+            results = iter(cached)
+        return results if streaming else list(results)
+
+    def _fetch(self, type: Type[T], query: Mapping[str, Any]) -> T:
+        routes = self._routes(self._source_routes_for, type)
+        if routes is None:
+            return super().get(type, query)
+        context = self._new_context()
+        for route in routes:
+            try:
+                return route.get(query, context)
+            except NotFoundError:
+                pass
+        raise NotFoundError("No source returned a query result!")
+
+    def _fetch_many(
+        self, type: Type[T], query: Mapping[str, Any], streaming: bool
+    ) -> Iterable[T]:
+        routes = self._routes(self._source_routes_for, type)
+        if routes is None:
+            return super().get_many(type, query, streaming)
+        context = self._new_context()
+        for route in routes:
+            try:
+                return route.get_many(query, context, streaming)
+            except NotFoundError:
+                pass
+        raise NotFoundError("No source returned a query result!")
+
+    def put(self, type: Type[T], item: T) -> None:
+        routes = self._routes(self._sink_routes_for, type)
+        if routes is None:
+            return super().put(type, item)
+        context = self._new_context()
+        for route in routes:
+            route.put(item, context)
+
+    def put_many(self, type: Type[T], items: Iterable[T]) -> None:
+        routes = self._routes(self._sink_routes_for, type)
+        if routes is None:
+            return super().put_many(type, items)
+        if routes:
+            items = list(items)
+            context = self._new_context()
+            for route in routes:
+                route.put_many(items, context)
@@ -13,6 +13,7 @@ from datapipelines import (
 )
 
 from ..data import Region, Platform
+from .pipeline import CassiopeiaPipeline
 
 T = TypeVar("T")
 
@@ -67,7 +68,7 @@ def create_pipeline(service_configs: Dict, verbose: int = 0) -> DataPipeline:
 
     services.append(MerakiAnalyticsCDN())
     services.append(LolWikia())
-    pipeline = DataPipeline(services, transformers)
+    pipeline = CassiopeiaPipeline(services, transformers)
 
     # Manually put the cache on the pipeline.
     for datastore in services:
@@ -77,6 +78,9 @@ def create_pipeline(service_configs: Dict, verbose: int = 0) -> DataPipeline:
     else:
         pipeline._cache = None
 
+    # Work out how to get and put every type now, rather than on the first request for each type
+    pipeline.precompute_routes()
+
     if verbose > 0:
         for service in services:
             print("Service:", service)
@@ -0,0 +1,118 @@
+"""Asyncio counterparts of the top-level data endpoints.
+
+The data pipeline is blocking, so each call runs on a shared thread pool and is awaited from the event loop.
+Ghost objects are fully loaded before they are returned so that accessing their attributes won't block the loop.
+
+Lazy results aren't loaded, though: iterating over e.g. the `MatchHistory` returned by `get_match_history` (or the
+matches in it) still makes blocking calls on the event loop's thread. Use `iterate` to iterate over them on the
+thread pool instead:
+
+    async for match in aio.iterate(await aio.get_match_history(continent=continent, puuid=puuid)):
+        ...
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+
+from . import cassiopeia as _cass
+from .core.common import CassiopeiaGhost
+
+T = TypeVar("T")
+
+_max_workers = 64
+_executor = None  # type: ThreadPoolExecutor
+_executor_lock = Lock()
+
+
+def set_max_workers(max_workers: int) -> None:
+    """Sets the number of threads used to run pipeline calls, which is the maximum number of requests in flight."""
+    global _max_workers, _executor
+    with _executor_lock:
+        _max_workers = max_workers
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_max_workers, thread_name_prefix="cassiopeia-aio"
+                )
+    return _executor
+
+
+async def run(function: Callable[..., T], *args, **kwargs) -> T:
+    """Runs a blocking function on the shared thread pool and awaits its result.
+
+    The caller's context variables are copied into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(
+        contextvars.copy_context().run, function, *args, **kwargs
+    )
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+_DONE = object()
+
+
+async def iterate(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """Iterates over a (lazy) iterable on the shared thread pool, loading each ghost object before it's yielded."""
+    iterator = await run(iter, iterable)
+    while True:
+        item = await run(_call_and_load, next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+def _call_and_load(function: Callable[..., T], *args, **kwargs) -> T:
+    result = function(*args, **kwargs)
+    if isinstance(result, CassiopeiaGhost):
+        result.load()
+    return result
+
+
+def _asynchronous(function: Callable[..., T]) -> Callable[..., T]:
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await run(_call_and_load, function, *args, **kwargs)
+
+    return wrapper
+
+
+get_league_entries = _asynchronous(_cass.get_league_entries)
+get_paginated_league_entries = _asynchronous(_cass.get_paginated_league_entries)
+get_master_league = _asynchronous(_cass.get_master_league)
+get_grandmaster_league = _asynchronous(_cass.get_grandmaster_league)
+get_challenger_league = _asynchronous(_cass.get_challenger_league)
+get_match_history = _asynchronous(_cass.get_match_history)
+get_match = _asynchronous(_cass.get_match)
+get_featured_matches = _asynchronous(_cass.get_featured_matches)
+get_current_match = _asynchronous(_cass.get_current_match)
+get_champion_masteries = _asynchronous(_cass.get_champion_masteries)
+get_champion_mastery = _asynchronous(_cass.get_champion_mastery)
+get_summoner = _asynchronous(_cass.get_summoner)
+get_account = _asynchronous(_cass.get_account)
+get_champion = _asynchronous(_cass.get_champion)
+get_champions = _asynchronous(_cass.get_champions)
+get_runes = _asynchronous(_cass.get_runes)
+get_summoner_spells = _asynchronous(_cass.get_summoner_spells)
+get_items = _asynchronous(_cass.get_items)
+get_maps = _asynchronous(_cass.get_maps)
+get_profile_icons = _asynchronous(_cass.get_profile_icons)
+get_realms = _asynchronous(_cass.get_realms)
+get_status = _asynchronous(_cass.get_status)
+get_language_strings = _asynchronous(_cass.get_language_strings)
+get_locales = _asynchronous(_cass.get_locales)
+get_versions = _asynchronous(_cass.get_versions)
+get_version = _asynchronous(_cass.get_version)
+get_verification_string = _asynchronous(_cass.get_verification_string)
+get_champion_rotations = _asynchronous(_cass.get_champion_rotations)
@@ -40,6 +40,7 @@ from .core import (
     ChampionRotation,
 )
 from .datastores import common as _common_datastore
+from .datastores.riotapi import ratelimits as _riotapi_ratelimits
 from ._configuration import Settings, load_config, get_default_config
 from . import configuration
 
@@ -84,6 +85,25 @@ def print_calls(calls: bool, api_key: bool = False):
     _common_datastore._print_api_key = api_key
 
 
+def request_priority(priority: int):
+    """Use as a context manager; Riot API requests made inside it are queued ahead of requests with a lower priority.
+
+    The default priority is 0, so e.g. interactive lookups can use a priority of 10 and a background crawl -10.
+    """
+    return _riotapi_ratelimits.request_priority(priority)
+
+
+def cache_stats() -> Dict[type, Dict[str, int]]:
+    """Returns the hits, misses, puts, expirations, evictions, entries and approximate size of each type in the cache.
+
+    Returns an empty dictionary if the pipeline has no cache.
+    """
+    cache = getattr(configuration.settings.pipeline, "_cache", None)
+    if cache is None:
+        return {}
+    return cache.stats()
+
+
 # Data endpoints
 
 
@@ -0,0 +1,29 @@
+"""Helpers shared by the data pipeline and the data stores."""
+from collections import abc
+from enum import Enum
+from typing import Any, Iterable, Mapping
+
+_ATOMIC_TYPES = (str, int, float, bool, Enum, type(None))
+
+
+def _freeze(value: Any) -> Any:
+    """Returns a hashable version of a query."""
+    if isinstance(value, _ATOMIC_TYPES):
+        return value
+    if isinstance(value, abc.Mapping):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _identifiers_key(query: Mapping[str, Any]) -> str:
+    """Returns the key of the list of identifiers in a `get_many` query, or None if there isn't exactly one."""
+    keys = [
+        key
+        for key, value in query.items()
+        if isinstance(value, Iterable) and not isinstance(value, (str, bytes, Mapping))
+    ]
+    return keys[0] if len(keys) == 1 else None
@@ -129,8 +129,7 @@ class Account(CassiopeiaGhost):
     @property
     def exists(self):
         try:
-            if not self._Ghost__all_loaded:
-                self.__load__()
+            self._load_unless_loaded()
             self.puuid  # Make sure we can access this attribute
             return True
         except (AttributeError, NotFoundError):
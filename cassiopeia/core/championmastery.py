@@ -191,7 +191,7 @@ class ChampionMastery(CassiopeiaGhost):
                 "lastPlayTime": None,
             }
             data = ChampionMasteryTransformer.champion_mastery_dto_to_data(None, dto)
-            self.__load_hook__(load_group, data)
+            self._put_load_group(load_group, data)
 
     def __eq__(self, other: "ChampionMastery"):
         if not isinstance(other, ChampionMastery) or self.region != other.region:
@@ -7,30 +7,62 @@ from enum import Enum
 import arrow
 import datetime
 import inspect
-
-from merakicommons.ghost import Ghost, ghost_load_on as _ghost_load_on
+import time
+from threading import Lock, RLock
+
+from merakicommons.ghost import (
+    Ghost,
+    GhostLoadingRequiredError,
+    ghost_load_on as _ghost_load_on,
+)
 from merakicommons.container import SearchableLazyList
 
 from .. import configuration
 from ..data import Region, Platform
+from ..tracing import span
 
 import json  # Can't use ujson here because of the encoder
 
 
 LOGGER = logging.getLogger("core")
 
+_LOAD_LOCK_CREATION = Lock()
+
 
 def ghost_load_on(method):
     return _ghost_load_on(AttributeError)(method)
 
 
+# How long the latest versions are remembered for without looking up the Realms again. They are also forgotten
+# whenever new Realms are cached.
+LATEST_VERSION_TTL = 5 * 60
+
+_latest_versions = {}  # (region, endpoint) -> (monotonic expiration time, version)
+
+
 def get_latest_version(region: Union[Region, str], endpoint: Optional[str]):
     from .staticdata.realm import Realms
 
+    key = (getattr(region, "value", region), endpoint)
+    now = time.monotonic()
+    try:
+        expires, version = _latest_versions[key]
+        if now < expires:
+            return version
+    except KeyError:
+        pass
+
     if endpoint is not None:
-        return Realms(region=region).latest_versions[endpoint]
+        version = Realms(region=region).latest_versions[endpoint]
     else:
-        return Realms(region=region).version
+        version = Realms(region=region).version
+    _latest_versions[key] = (now + LATEST_VERSION_TTL, version)
+    return version
+
+
+def invalidate_latest_versions() -> None:
+    """Forgets the latest versions, so the next `get_latest_version` looks up the Realms again."""
+    _latest_versions.clear()
 
 
 class CoreData(object):
@@ -235,19 +267,62 @@ class CassiopeiaPipelineObject(CassiopeiaObject, metaclass=GetFromPipeline):
         return not self == other
 
 
+class _GhostProperty(Ghost._Ghost__property):
+    # Ghost's property, except that a load group that another thread loads while this one is reading the property is
+    # used as it is. (Ghost would load it again, and __load__ raises ValueError for groups that are already loaded.)
+    def __get__(self, obj, obj_type=None):
+        if obj is None:
+            return self
+        load_group = self.fget._Ghost__load_group
+        was_loaded = obj._Ghost__is_loaded(load_group)
+        try:
+            return self.fget(obj)
+        except GhostLoadingRequiredError:
+            if was_loaded:
+                obj.__load__(load_group)
+            else:
+                obj._load_unless_loaded(load_group)
+            obj._Ghost__set_loaded(load_group)
+            return self.fget(obj)
+
+
 class CassiopeiaGhost(CassiopeiaPipelineObject, Ghost):
+    @property
+    def _load_lock(self) -> RLock:
+        """Held while the data of a load group is put on this object, so that threads sharing the object put it once.
+
+        It isn't held while the data is requested, so loading other objects from a load never waits for this lock.
+        """
+        try:
+            return self.__load_lock
+        except AttributeError:
+            with _LOAD_LOCK_CREATION:
+                if "_CassiopeiaGhost__load_lock" not in self.__dict__:
+                    self.__load_lock = RLock()
+            return self.__load_lock
+
+    def __getstate__(self):
+        # Locks can't be pickled (or copied); the copy gets its own lock when it's first loaded
+        state = self.__dict__.copy()
+        state.pop("_CassiopeiaGhost__load_lock", None)
+        return state
+
     def load(self, load_groups: Set = None) -> "CassiopeiaGhost":
         if load_groups is None:
             load_groups = self._Ghost__load_groups
         if self._Ghost__all_loaded:
             return self
-        self.__load__()
+        self._load_unless_loaded()
         for load_group in load_groups:
-            self._Ghost__set_loaded(
-                load_group
-            )  # __load__ doesn't trigger __set_loaded.
+            self._Ghost__set_loaded(load_group)
         return self
 
+    async def aload(self, load_groups: Set = None) -> "CassiopeiaGhost":
+        """Loads this object on the shared async thread pool without blocking the event loop."""
+        from ..aio import run
+
+        return await run(self.load, load_groups)
+
     def __load__(self, load_group: CoreData = None, load_groups: Set = None) -> None:
         if load_groups is None:
             load_groups = self._Ghost__load_groups
@@ -255,24 +330,56 @@ class CassiopeiaGhost(CassiopeiaPipelineObject, Ghost):
             if self._Ghost__all_loaded:
                 raise ValueError("object has already been loaded.")
             for group in load_groups:
-                if not self._Ghost__is_loaded(group):
-                    self.__load__(group)
+                self._load_unless_loaded(group)
         else:  # Load the specific load group
             if self._Ghost__is_loaded(load_group):
                 raise ValueError("object has already been loaded.")
-            query = self.__get_query__()
-            if (
-                hasattr(self.__class__, "version")
-                and "version" not in query
-                and self.__class__.__name__ not in ["Realms", "Match"]
+            with span(
+                "load",
+                object=self.__class__.__name__,
+                group=getattr(load_group, "__name__", load_group),
             ):
-                query["version"] = get_latest_version(
-                    region=query["region"], endpoint=None
-                )
-            data = configuration.settings.pipeline.get(
-                type=self._load_types[load_group], query=query
+                data = self.__get_load_group(load_group)
+            self._put_load_group(load_group, data)
+
+    def _load_unless_loaded(self, load_group: CoreData = None) -> None:
+        """Loads `load_group` (or every load group) like `__load__`, except that a group that is already loaded, or
+        that another thread loads in the meantime, is skipped instead of raising ValueError.
+        """
+        if self.__is_loaded(load_group):
+            return
+        try:
+            self.__load__(load_group)
+        except ValueError:
+            if not self.__is_loaded(load_group):
+                raise
+
+    def __is_loaded(self, load_group: Optional[CoreData]) -> bool:
+        if load_group is None:
+            return self._Ghost__all_loaded
+        return self._Ghost__is_loaded(load_group)
+
+    def _put_load_group(self, load_group: CoreData, data: CoreData) -> None:
+        # Threads that load the same group at once all request its data, and the first one to get it puts it on the
+        # object (requests for the same data at the same time are usually shared by the pipeline)
+        with self._load_lock:
+            if not self._Ghost__is_loaded(load_group):
+                self.__load_hook__(load_group, data)
+                self._Ghost__set_loaded(load_group)
+
+    def __get_load_group(self, load_group: CoreData) -> CoreData:
+        query = self.__get_query__()
+        if (
+            hasattr(self.__class__, "version")
+            and "version" not in query
+            and self.__class__.__name__ not in ["Realms", "Match"]
+        ):
+            query["version"] = get_latest_version(
+                region=query["region"], endpoint=None
             )
-            self.__load_hook__(load_group, data)
+        return configuration.settings.pipeline.get(
+            type=self._load_types[load_group], query=query
+        )
 
     @property
     def _load_types(cls):
@@ -317,6 +424,19 @@ class CassiopeiaGhost(CassiopeiaPipelineObject, Ghost):
             )
         self._data[load_group] = data
 
+    # Defined last so that `property` is still the builtin in the rest of the class
+    @staticmethod
+    def property(load_group):
+        ghost_property = Ghost.property(load_group)
+
+        def decorator(method):
+            prop = ghost_property(method)
+            prop = _GhostProperty(prop.fget, prop.fset, prop.fdel, prop.__doc__)
+            prop._Ghost__load_group = load_group
+            return prop
+
+        return decorator
+
 
 class CassiopeiaLazyList(SearchableLazyList, CassiopeiaPipelineObject):
     def __init__(self, *args, **kwargs):
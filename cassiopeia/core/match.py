@@ -57,9 +57,7 @@ def load_match_on_attributeerror(method):
         except AttributeError:  # teamId
             # The match has only partially loaded this participant and it doesn't have all it's data, so load the full match
             match = getattr(self, "_{}__match".format(self.__class__.__name__))
-            if not match._Ghost__is_loaded(MatchData):
-                match.__load__(MatchData)
-                match._Ghost__set_loaded(MatchData)
+            match._load_unless_loaded(MatchData)
             if isinstance(self, Participant):
                 old_participant = self
             elif isinstance(self, ParticipantStats):
@@ -1994,16 +1992,13 @@ class Match(CassiopeiaGhost):
     @ghost_load_on
     def participants(self) -> SearchableList:
         if hasattr(self._data[MatchData], "participants"):
-            if not self._Ghost__is_loaded(MatchData):
-                self.__load__(MatchData)
-                self._Ghost__set_loaded(
-                    MatchData
-                )  # __load__ doesn't trigger __set_loaded.
             # TODO: this is probably not the way to go, but it prevents participants being reappended every time match.participants is called
-            if len(self.__participants) == 0:
-                for p in self._data[MatchData].participants:
-                    participant = Participant.from_data(p, match=self)
-                    self.__participants.append(participant)
+            self._load_unless_loaded(MatchData)
+            with self._load_lock:
+                if len(self.__participants) == 0:
+                    for p in self._data[MatchData].participants:
+                        participant = Participant.from_data(p, match=self)
+                        self.__participants.append(participant)
 
         else:
             self.__participants = []
@@ -2014,11 +2009,7 @@ class Match(CassiopeiaGhost):
     @ghost_load_on
     @lazy
     def teams(self) -> List[Team]:
-        if not self._Ghost__is_loaded(MatchData):
-            self.__load__(MatchData)
-            self._Ghost__set_loaded(
-                MatchData
-            )  # __load__ doesn't trigger __set_loaded.
+        self._load_unless_loaded(MatchData)
         return [
             Team.from_data(t, match=self)
             for i, t in enumerate(self._data[MatchData].teams)
@@ -2108,8 +2099,7 @@ class Match(CassiopeiaGhost):
     @property
     def exists(self) -> bool:
         try:
-            if not self._Ghost__all_loaded:
-                self.__load__()
+            self._load_unless_loaded()
             self.type  # Make sure we can access this attribute
             return True
         except (AttributeError, NotFoundError):
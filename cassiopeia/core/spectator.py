@@ -296,8 +296,7 @@ class CurrentMatch(CassiopeiaGhost):
     @property
     def exists(self):
         try:
-            if not self._Ghost__all_loaded:
-                self.__load__()
+            self._load_unless_loaded()
             self.creation  # Make sure we can access this attribute
             return True
         except (AttributeError, NotFoundError):
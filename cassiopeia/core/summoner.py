@@ -146,8 +146,7 @@ class Summoner(CassiopeiaGhost):
     @property
     def exists(self):
         try:
-            if not self._Ghost__all_loaded:
-                self.__load__()
+            self._load_unless_loaded()
             self.revision_date  # Make sure we can access this attribute
             return True
         except (AttributeError, NotFoundError):
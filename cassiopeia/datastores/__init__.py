@@ -1,4 +1,5 @@
 from .cache import Cache
+from .sqlitestore import SQLiteStore
 from .riotapi import RiotAPI
 from .kernel import Kernel
 from .ddragon import DDragon
@@ -1,5 +1,22 @@
-from typing import Type, Mapping, Any, Iterable, TypeVar, Tuple, Callable, Generator
+from typing import (
+    Type,
+    Mapping,
+    Any,
+    Iterable,
+    TypeVar,
+    Callable,
+    Generator,
+    Union,
+    Dict,
+    List,
+)
+from threading import Lock, Thread, local
+import atexit
 import datetime
+import os
+import pickle
+import time
+import weakref
 
 from datapipelines import (
     DataSource,
@@ -7,10 +24,12 @@ from datapipelines import (
     PipelineContext,
     validate_query,
     NotFoundError,
+    UnsupportedError,
+    QueryValidationError,
 )
-from merakicommons.cache import Cache as CommonsCache
-
 from . import uniquekeys
+from .cachestore import CacheStore, CacheStats
+from ..common import _freeze
 from ..core.staticdata.champion import (
     ChampionData,
     ChampionListData,
@@ -64,6 +83,7 @@ from ..core.spectator import (
     FeaturedMatches,
 )
 from ..core.champion import ChampionRotationData, ChampionRotation
+from ..core.common import invalidate_latest_versions
 
 T = TypeVar("T")
 
@@ -102,10 +122,59 @@ default_expirations = {
     FeaturedMatches: datetime.timedelta(hours=0.5),
 }
 
+# How long a query that wasn't found anywhere is answered with NotFoundError without asking the other data sources
+# again. A core type also applies to the data types it loads.
+default_not_found_expirations = {
+    Summoner: datetime.timedelta(minutes=15),
+    Account: datetime.timedelta(minutes=15),
+    ChampionMastery: datetime.timedelta(minutes=15),
+    Match: datetime.timedelta(minutes=5),
+    Timeline: datetime.timedelta(minutes=5),
+    CurrentMatch: datetime.timedelta(minutes=1),
+}
+
+
+class _NotFound(object):
+    """The partition of the cache store that holds the queries of a type that weren't found."""
+
+    __slots__ = ["type"]
+
+    def __init__(self, type: type):
+        self.type = type
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _NotFound) and other.type is self.type
+
+    def __hash__(self) -> int:
+        return hash((_NotFound, self.type))
+
+
+def _save_snapshot(reference: "weakref.ref[Cache]") -> None:
+    cache = reference()
+    if cache is not None:
+        try:
+            cache.save_snapshot()
+        except OSError:
+            pass  # Nothing can be done about it at exit; the next run starts out empty
+
 
 class Cache(DataSource, DataSink):
-    def __init__(self, expirations: Mapping[type, float] = None) -> None:
-        self._cache = CommonsCache()
+    PARTIAL_RESULTS = "partial_results"
+
+    def __init__(
+        self,
+        expirations: Mapping[type, float] = None,
+        max_entries: Union[int, Mapping[type, int]] = None,
+        max_bytes: int = None,
+        sweep_interval: float = 60.0,
+        max_sweep_per_tick: int = 1000,
+        compress: Iterable[type] = None,
+        hot_entries: int = 1000,
+        not_found_expirations: Mapping[type, float] = None,
+        stale_while_revalidate: Iterable[type] = (Realms, Versions),
+        max_stale: float = 24 * 60 * 60,
+        snapshot_file: str = None,
+    ) -> None:
         self._expirations = (
             dict(expirations) if expirations is not None else default_expirations
         )
@@ -117,6 +186,83 @@ class Cache(DataSource, DataSink):
             if value != -1 and isinstance(value, datetime.timedelta):
                 self._expirations[key] = value.seconds + 24 * 60 * 60 * value.days
 
+        # An int limits every type to that many entries
+        default_max_entries = None
+        if isinstance(max_entries, int):
+            default_max_entries, max_entries = max_entries, None
+        max_entries = {
+            globals()[key] if isinstance(key, str) else key: value
+            for key, value in (max_entries or {}).items()
+        }
+        if compress is not None:
+            compress = [
+                globals()[type] if isinstance(type, str) else type for type in compress
+            ]
+        self._cache = CacheStore(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            default_max_entries=default_max_entries,
+            compress=compress,
+            hot_entries=hot_entries,
+        )
+
+        self._not_found_expirations = {}
+        self._not_found_core_types = {}  # The type the cache stores for each type in _not_found_expirations
+        if not_found_expirations is None:
+            not_found_expirations = default_not_found_expirations
+        for key, value in not_found_expirations.items():
+            if isinstance(key, str):
+                key = globals()[key]
+            if isinstance(value, datetime.timedelta):
+                value = value.total_seconds()
+            for type in [key] + list(getattr(key, "_data_types", [])):
+                self._not_found_expirations[type] = value
+                self._not_found_core_types[type] = key
+        self._not_found_hits = {}
+        self._not_found_hits_lock = Lock()
+
+        # Expired objects of these types are still returned for up to `max_stale` seconds while a background thread
+        # gets a new one, so that a request doesn't have to wait for it.
+        self._stale_while_revalidate = {
+            globals()[type] if isinstance(type, str) else type
+            for type in stale_while_revalidate or ()
+        }
+        self._max_stale = max_stale
+        self._revalidating = set()  # The (type, key)s being refreshed
+        self._revalidating_lock = Lock()
+        self._revalidating_thread = local()  # The type the current thread is refreshing
+
+        # Expired entries are removed in the background instead of staying in memory until they are next requested
+        if sweep_interval:
+            self._cache.start_sweeper(sweep_interval, max_sweep_per_tick)
+
+        # The cache is saved when the program exits and restored here, so a restarted program starts out warm
+        self._snapshot_file = snapshot_file
+        if snapshot_file is not None:
+            self.load_snapshot()
+            atexit.register(_save_snapshot, weakref.ref(self))
+
+    def save_snapshot(self, filename: str = None) -> None:
+        if filename is None:
+            filename = self._snapshot_file
+        snapshot = self._cache.snapshot()
+        snapshot["saved_at"] = time.time()
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as f:
+            pickle.dump(snapshot, f, protocol=5)
+        os.replace(temporary_filename, filename)
+
+    def load_snapshot(self, filename: str = None) -> None:
+        if filename is None:
+            filename = self._snapshot_file
+        try:
+            with open(filename, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return  # Start out empty if there is no usable snapshot
+        elapsed = max(time.time() - snapshot["saved_at"], 0.0)
+        self._cache.restore(snapshot, elapsed)
+
     @DataSource.dispatch
     def get(
         self, type: Type[T], query: Mapping[str, Any], context: PipelineContext = None
@@ -146,14 +292,59 @@ class Cache(DataSource, DataSink):
         key_function: Callable[[Mapping[str, Any]], Any],
         context: PipelineContext = None,
     ) -> T:
+        if self.is_revalidating(type):
+            raise NotFoundError
         keys = key_function(query)
-        for key in keys:
-            try:
-                return self._cache.get(type, key)
-            except KeyError:
-                pass
-        else:
+        try:
+            item, stale = self._cache.get_first(type, keys)
+        except KeyError:
             raise NotFoundError
+        if stale:
+            self._revalidate(type, keys[0], query, context)
+        return item
+
+    def is_revalidating(self, type: Type[T]) -> bool:
+        """Whether the current thread is refreshing a stale object of `type`."""
+        return getattr(self._revalidating_thread, "type", None) is type
+
+    def _revalidate(
+        self,
+        type: Type[T],
+        key: Any,
+        query: Mapping[str, Any],
+        context: PipelineContext = None,
+    ) -> None:
+        if context is None or context.get(PipelineContext.Keys.PIPELINE) is None:
+            return
+        with self._revalidating_lock:
+            if (type, key) in self._revalidating:
+                return
+            self._revalidating.add((type, key))
+        Thread(
+            target=self._refresh,
+            args=(type, key, dict(query), context[PipelineContext.Keys.PIPELINE]),
+            name="cassiopeia-cache-revalidate",
+            daemon=True,
+        ).start()
+
+    def _refresh(
+        self, type: Type[T], key: Any, query: Mapping[str, Any], pipeline: Any
+    ) -> None:
+        from ..core.common import CassiopeiaGhost
+
+        # While the new object is loaded, this thread ignores the stale one and doesn't cache the unloaded one
+        self._revalidating_thread.type = type
+        try:
+            item = pipeline.get(type, query)
+            if isinstance(item, CassiopeiaGhost):
+                item.load()
+        except Exception:
+            return  # The stale object is kept until it expires
+        finally:
+            self._revalidating_thread.type = None
+            with self._revalidating_lock:
+                self._revalidating.discard((type, key))
+        self.put(type, item)
 
     def _get_many(
         self,
@@ -161,23 +352,30 @@ class Cache(DataSource, DataSink):
         query: Mapping[str, Any],
         key_generator: Callable[[Mapping[str, Any]], Any],
         context: PipelineContext = None,
-    ) -> Generator[T, None, None]:
+    ) -> Iterable[T]:
+        results = []
         for keys in key_generator(query):
-            for key in keys:
-                try:
-                    yield self._cache.get(type, key)
-                except KeyError:
-                    pass
-            else:
-                raise NotFoundError
-
-    @staticmethod
-    def _put_many_generator(
-        items: Iterable[T], key_function: Callable[[T], Any]
-    ) -> Generator[Tuple[Any, T], None, None]:
-        for item in items:
-            for key in key_function(item):
-                yield key, item
+            try:
+                results.append(self._cache.get_first(type, keys)[0])
+            except KeyError:
+                results.append(None)
+        if context is not None and context.get(Cache.PARTIAL_RESULTS):
+            return results
+        if any(result is None for result in results):
+            raise NotFoundError
+        return iter(results)
+
+    def get_many_cached(self, type: Type[T], query: Mapping[str, Any]) -> List[T]:
+        """Returns the cached result for each of the items in a `get_many` query, or None for the ones that aren't cached.
+
+        Returns None if the cache doesn't store `type`.
+        """
+        context = PipelineContext()
+        context[Cache.PARTIAL_RESULTS] = True
+        try:
+            return self.get_many(type, dict(query), context)
+        except (UnsupportedError, QueryValidationError):
+            return None
 
     def _put(
         self,
@@ -192,9 +390,7 @@ class Cache(DataSource, DataSink):
             expire_seconds = -1
 
         if expire_seconds != 0:
-            keys = key_function(item)
-            for key in keys:
-                self._cache.put(type, key, item, expire_seconds)
+            self._store(type, key_function(item), item, expire_seconds)
 
     def _put_many(
         self,
@@ -204,18 +400,106 @@ class Cache(DataSource, DataSink):
         context: PipelineContext = None,
     ) -> None:
         expire_seconds = self._expirations.get(type, default_expirations[type])
-        for key, item in Cache._put_many_generator(items, key_function):
-            self._cache.put(type, key, item, expire_seconds)
+        for item in items:
+            self._store(type, key_function(item), item, expire_seconds)
 
-    def clear(self, type: Type[T] = None):
-        if type is None:
-            for key in self._cache._data:
-                self._cache._data[key].clear()
+    def _store(
+        self, type: Type[T], keys: List[Any], item: T, expire_seconds: float
+    ) -> None:
+        # The first key is canonical and the others are aliases, so the item is stored (and expired) once
+        if self.is_revalidating(type) or not keys:
+            return
+        if type in self._stale_while_revalidate and expire_seconds not in (0, -1):
+            self._cache.put(
+                type,
+                keys[0],
+                item,
+                expire_seconds + self._max_stale,
+                stale_after=expire_seconds,
+                aliases=keys[1:],
+            )
         else:
-            self._cache._data[type].clear()
+            self._cache.put(type, keys[0], item, expire_seconds, aliases=keys[1:])
+
+    def clear(self, type: Type[T] = None):
+        self._cache.clear(type)
+        if type is None or type is Realms:
+            invalidate_latest_versions()
+        if type is not None:
+            self._cache.clear(_NotFound(type))
 
     def expire(self, type: Type[T] = None):
         self._cache.expire(type)
+        if type is not None:
+            self._cache.expire(_NotFound(type))
+
+    def check_not_found(self, type: Type[T], query: Mapping[str, Any]) -> None:
+        """Raises NotFoundError if `query` recently wasn't found by any data source."""
+        if type not in self._not_found_expirations:
+            return
+        try:
+            frozen = _freeze(query)
+            not_found = self._cache.contains(_NotFound(type), frozen)
+        except TypeError:  # The query isn't hashable
+            return
+        if not_found and self._is_cached(self._not_found_core_types[type], query):
+            # The object was put in the cache after the query wasn't found
+            self._cache.delete(_NotFound(type), frozen)
+            return
+        if not_found:
+            with self._not_found_hits_lock:
+                self._not_found_hits[type] = self._not_found_hits.get(type, 0) + 1
+            raise NotFoundError(
+                'Query "{query}" for "{type}" was recently not found'.format(
+                    query=query, type=type.__name__
+                )
+            )
+
+    def _is_cached(self, type: Type[T], query: Mapping[str, Any]) -> bool:
+        try:
+            self.get(type, query)
+        except (NotFoundError, UnsupportedError, QueryValidationError):
+            return False
+        return True
+
+    def put_not_found(self, type: Type[T], query: Mapping[str, Any]) -> None:
+        try:
+            expire_seconds = self._not_found_expirations[type]
+        except KeyError:
+            return
+        try:
+            self._cache.put(_NotFound(type), _freeze(query), True, expire_seconds)
+        except TypeError:
+            pass
+
+    @property
+    def not_found_hits(self) -> Dict[type, int]:
+        """The number of queries of each type that were answered with NotFoundError instead of being requested again.
+
+        Each is a request (and its rate limit permits) that was saved.
+        """
+        with self._not_found_hits_lock:
+            return dict(self._not_found_hits)
+
+    def stats(self) -> Dict[type, Dict[str, int]]:
+        """Returns the hits, misses, puts, expirations, evictions, number of entries, and approximate size in bytes of
+        each type in the cache.
+
+        `not_found_hits` is the number of queries that were answered from the cached queries that weren't found.
+        """
+        result = {}
+        for type, stats in self._cache.stats().items():
+            if isinstance(type, _NotFound):
+                continue
+            result[type] = stats
+        for type, hits in self.not_found_hits.items():
+            stats = result.setdefault(
+                type, {name: 0 for name in CacheStats.__slots__ + ["entries", "bytes"]}
+            )
+            stats["not_found_hits"] = hits
+        for stats in result.values():
+            stats.setdefault("not_found_hits", 0)
+        return result
 
     #####################
     # Champion Rotation #
@@ -373,10 +657,9 @@ class Cache(DataSource, DataSink):
         self._put(
             ChampionMasteries, item, uniquekeys.for_champion_masteries, context=context
         )
-        for cm in item:
-            self._put(
-                ChampionMastery, cm, uniquekeys.for_champion_mastery, context=context
-            )
+        self._put_many(
+            ChampionMastery, item, uniquekeys.for_champion_mastery, context=context
+        )
 
     @put_many.register(ChampionMasteries)
     def put_many_champion_masteries(
@@ -1013,12 +1296,14 @@ class Cache(DataSource, DataSink):
     @put.register(Realms)
     def put_realms(self, item: Realms, context: PipelineContext = None) -> None:
         self._put(Realms, item, uniquekeys.for_realms, context=context)
+        invalidate_latest_versions()
 
     @put_many.register(Realms)
     def put_many_realms(
         self, items: Iterable[Realms], context: PipelineContext = None
     ) -> None:
         self._put_many(Realms, items, uniquekeys.for_realms, context=context)
+        invalidate_latest_versions()
 
     @get.register(RealmData)
     @validate_query(
@@ -0,0 +1,546 @@
+from typing import Any, Dict, Iterable, Mapping, Tuple
+from collections import OrderedDict
+from enum import Enum
+from heapq import heappush, heappop, heapify
+from itertools import count
+from threading import RLock, Event, Thread
+from time import monotonic
+import pickle
+import sys
+import types
+import weakref
+import zlib
+
+
+_UNPICKLABLE = object()
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), Enum)
+
+# Shared objects that aren't counted. Callable objects in general are counted: every core object defines __call__.
+_SHARED_TYPES = (
+    type,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.ModuleType,
+)
+
+
+def approximate_size(value: Any) -> int:
+    """Returns the approximate number of bytes used by `value` and everything it references.
+
+    Objects referenced more than once are only counted once. Classes, functions, modules, and enum members are
+    shared, so they aren't counted.
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, Enum):
+            continue
+        size += sys.getsizeof(obj, 0)
+        if isinstance(obj, _ATOMIC_TYPES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for slot in getattr(type(obj), "__slots__", ()):
+            try:
+                stack.append(getattr(obj, slot))
+            except AttributeError:
+                pass
+    return size
+
+
+class _Stored(object):
+    """A value in the store, shared by every key it is stored under in the partition of one type."""
+
+    __slots__ = ["type", "value", "size", "references", "compressed"]
+
+    def __init__(self, type: Any, value: Any, size: int):
+        self.type = type
+        self.value = value  # The object, or its pickled and compressed bytes
+        self.size = size
+        self.references = 0
+        self.compressed = False
+
+
+class _Entry(object):
+    __slots__ = ["stored", "expires", "stale", "aliases"]
+
+    def __init__(self, stored: _Stored, expires: float, stale: float = None):
+        self.stored = stored
+        self.aliases = []  # The other keys the value can be looked up by
+        self.expires = expires  # Monotonic time after which the entry is expired, or None
+        self.stale = stale  # Monotonic time after which the entry is still served but should be refreshed, or None
+
+    def expired(self, now: float) -> bool:
+        return self.expires is not None and now > self.expires
+
+
+class CacheStats(object):
+    """Counters for the entries of one type in a `CacheStore`."""
+
+    __slots__ = ["hits", "misses", "puts", "expirations", "evictions"]
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CacheStore(object):
+    """An in-memory key-value store, partitioned by type, with expiration times and LRU eviction.
+
+    Each entry has one canonical key and any number of aliases, so an object that can be looked up in several ways
+    (e.g. a summoner by puuid, id, or name) is stored, expired, and evicted once.
+
+    `max_entries` limits the number of entries for each type (types that aren't in it are limited to
+    `default_max_entries`), and `max_bytes` limits the approximate memory used by every value in the store. When either is exceeded, the least recently used entries are evicted. An object stored
+    in several entries of one type is only counted once towards `max_bytes`.
+
+    Values of the types in `compress` are pickled and compressed once they aren't among the `hot_entries` most
+    recently used values of those types, and are unpickled when they are next requested. An unpickled value is a copy
+    of the value that was put.
+    """
+
+    def __init__(
+        self,
+        max_entries: Mapping[Any, int] = None,
+        max_bytes: int = None,
+        default_max_entries: int = None,
+        compress: Iterable[Any] = None,
+        hot_entries: int = 1000,
+    ) -> None:
+        self._max_entries = dict(max_entries) if max_entries is not None else {}
+        self._default_max_entries = default_max_entries
+        self._max_bytes = max_bytes
+        self._compress = frozenset(compress) if compress is not None else frozenset()
+        self._hot_entries = hot_entries
+
+        self._data = {}  # type: Dict[Any, OrderedDict]  # type -> canonical key -> entry
+        self._aliases = {}  # type: Dict[Any, Dict[Any, Any]]  # type -> alias -> canonical key
+        self._recency = OrderedDict()  # (type, canonical key) -> None, least recently used first
+        # (type, id(value)) -> stored value, for uncompressed values. Each type has its own, since the partitions of
+        # the types that are compressed and those that aren't can hold the same object.
+        self._objects = {}  # type: Dict[Tuple[Any, int], _Stored]
+        self._hot = OrderedDict()  # type: Dict[int, _Stored]  # Uncompressed values that can be compressed
+        self._bytes = 0
+        self._stats = {}  # type: Dict[Any, CacheStats]
+        self._lock = RLock()
+
+        # Heap of (expires, sequence, type, key) for the background sweeper. Entries that were removed or re-put
+        # leave stale items behind, which are skipped when they come up.
+        self._expirations = []
+        self._sequence = count()
+        self._sweeper_stopped = None
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._recency)
+
+    def put(
+        self,
+        type: Any,
+        key: Any,
+        value: Any,
+        timeout: float = -1,
+        stale_after: float = None,
+        aliases: Iterable[Any] = (),
+    ) -> None:
+        """Stores `value` under `key` and `aliases` for `timeout` seconds (-1 to never expire).
+
+        If `stale_after` is given, `get_stale` reports the entry as stale after that many seconds. Keys or aliases
+        that belonged to another entry are taken over; if one was that entry's canonical key, the entry is removed.
+        """
+        if timeout == 0:
+            return
+        now = monotonic()
+        expires = None if timeout == -1 else now + timeout
+        stale = None if stale_after is None else now + stale_after
+        keys = [key]
+        keys.extend(aliases)
+        with self._lock:
+            self._stats_for(type).puts += 1
+            for canonical in keys:
+                canonical = self._canonical(type, canonical)
+                if (
+                    canonical is not None
+                    and self._data[type][canonical].stored.value is value
+                ):
+                    break
+            else:
+                canonical = None
+
+            if canonical is not None:
+                entry = self._data[type][canonical]
+                # Sizes are estimated on put, so re-estimate in case the object was loaded with more data
+                self._resize(entry.stored, self._estimate(value))
+                entry.expires = expires
+                entry.stale = stale
+                self._schedule_expiration(type, canonical, expires)
+                self._touch(type, canonical)
+            else:
+                for other in keys:
+                    self._unlink(type, other)
+                stored = self._objects.get((type, id(value)))
+                if stored is None:
+                    stored = _Stored(type, value, self._estimate(value))
+                    self._objects[(type, id(value))] = stored
+                    self._bytes += stored.size
+                stored.references += 1
+                canonical = key
+                entry = _Entry(stored, expires, stale)
+                self._data.setdefault(type, OrderedDict())[canonical] = entry
+                self._recency[(type, canonical)] = None
+                self._schedule_expiration(type, canonical, expires)
+            for alias in keys:
+                if alias != canonical:
+                    self._alias(type, alias, canonical)
+            self._use(type, entry.stored)
+            self._evict(type)
+
+    def get(self, type: Any, key: Any) -> Any:
+        return self.get_first(type, [key])[0]
+
+    def get_stale(self, type: Any, key: Any) -> Tuple[Any, bool]:
+        """Returns the value stored for `key` and whether it is stale."""
+        return self.get_first(type, [key])
+
+    def get_first(self, type: Any, keys: Iterable[Any]) -> Tuple[Any, bool]:
+        """Returns the value stored for the first of `keys` that is in the store, and whether it is stale.
+
+        Counts as one hit or miss however many keys are tried.
+        """
+        with self._lock:
+            stats = self._stats_for(type)
+            now = monotonic()
+            for key in keys:
+                key = self._canonical(type, key)
+                if key is None:
+                    continue
+                entry = self._data[type][key]
+                if entry.expired(now):
+                    self._remove(type, key)
+                    stats.expirations += 1
+                    continue
+                stats.hits += 1
+                self._touch(type, key)
+                if entry.stored.compressed:
+                    self._inflate(entry.stored)
+                value = entry.stored.value
+                self._use(type, entry.stored)
+                return value, entry.stale is not None and now > entry.stale
+            stats.misses += 1
+            raise KeyError(type)
+
+    def delete(self, type: Any, key: Any) -> None:
+        """Removes the entry that `key` is the canonical key or an alias of."""
+        with self._lock:
+            canonical = self._canonical(type, key)
+            if canonical is None:
+                raise KeyError(key)
+            self._remove(type, canonical)
+
+    def contains(self, type: Any, key: Any) -> bool:
+        with self._lock:
+            key = self._canonical(type, key)
+            if key is None:
+                return False
+            return not self._data[type][key].expired(monotonic())
+
+    def expire(self, type: Any = None) -> None:
+        with self._lock:
+            now = monotonic()
+            types = list(self._data) if type is None else [type]
+            for type in types:
+                for key, entry in list(self._data.get(type, {}).items()):
+                    if entry.expired(now):
+                        self._remove(type, key)
+                        self._stats_for(type).expirations += 1
+
+    def clear(self, type: Any = None) -> None:
+        with self._lock:
+            types = list(self._data) if type is None else [type]
+            for type in types:
+                for key in list(self._data.get(type, ())):
+                    self._remove(type, key)
+
+    def snapshot(self) -> Dict[str, list]:
+        """Returns the entries that haven't expired, with their values pickled, in a form that `restore` accepts.
+
+        Values that can't be pickled are left out.
+        """
+        with self._lock:
+            now = monotonic()
+            entries = [
+                (type, key, self._data[type][key])
+                for type, key in self._recency
+                if not self._data[type][key].expired(now)
+            ]
+            stored = {id(entry.stored): entry.stored for _, _, entry in entries}
+            # Pickle the values outside of the lock; a value that changes while it's pickled is skipped
+            values = {
+                ref: (value.value, value.compressed) for ref, value in stored.items()
+            }
+
+        pickled = {}
+        for ref, (value, compressed) in values.items():
+            if compressed:
+                pickled[ref] = zlib.decompress(value)
+            else:
+                try:
+                    pickled[ref] = pickle.dumps(value, protocol=5)
+                except Exception:
+                    pass
+        ids = {ref: index for index, ref in enumerate(pickled)}
+        return {
+            "values": list(pickled.values()),
+            "entries": [
+                (
+                    type,
+                    key,
+                    ids[id(entry.stored)],
+                    None if entry.expires is None else entry.expires - now,
+                    None if entry.stale is None else entry.stale - now,
+                    tuple(entry.aliases),
+                )
+                for type, key, entry in entries
+                if id(entry.stored) in ids
+            ],
+        }
+
+    def restore(self, snapshot: Dict[str, list], elapsed: float = 0.0) -> None:
+        """Puts the entries of a `snapshot` that was taken `elapsed` seconds ago, least recently used first."""
+        values = {}
+        for type, key, index, expires_in, stale_in, aliases in snapshot["entries"]:
+            if expires_in is not None and expires_in <= elapsed:
+                continue
+            if index not in values:
+                try:
+                    values[index] = pickle.loads(snapshot["values"][index])
+                except Exception:
+                    values[index] = _UNPICKLABLE
+            if values[index] is _UNPICKLABLE:
+                continue  # E.g. the class changed since the snapshot was taken
+            self.put(
+                type,
+                key,
+                values[index],
+                -1 if expires_in is None else expires_in - elapsed,
+                None if stale_in is None else stale_in - elapsed,
+                aliases,
+            )
+
+    def stats(self) -> Dict[Any, Dict[str, int]]:
+        """Returns the counters, number of entries, and approximate size in bytes for each type.
+
+        Sizes are only tracked if `max_bytes` is set; otherwise they are estimated now, which can take a while.
+        """
+        with self._lock:
+            result = {}
+            for type in set(self._stats) | set(self._data):
+                stats = self._stats_for(type).to_dict()
+                entries = self._data.get(type, {})
+                stats["entries"] = len(entries)
+                values = {id(entry.stored): entry.stored for entry in entries.values()}
+                if self._max_bytes is not None:
+                    stats["bytes"] = sum(stored.size for stored in values.values())
+                else:
+                    stats["bytes"] = sum(
+                        sys.getsizeof(stored.value)
+                        if stored.compressed
+                        else approximate_size(stored.value)
+                        for stored in values.values()
+                    )
+                result[type] = stats
+            return result
+
+    def sweep(self, max_entries: int = None) -> int:
+        """Removes up to `max_entries` expired entries, soonest expired first. Returns the number removed."""
+        removed = 0
+        with self._lock:
+            now = monotonic()
+            while self._expirations and self._expirations[0][0] <= now:
+                if max_entries is not None and removed >= max_entries:
+                    break
+                expires, _, type, key = heappop(self._expirations)
+                entry = self._data.get(type, {}).get(key)
+                if entry is not None and entry.expires == expires:
+                    self._remove(type, key)
+                    self._stats_for(type).expirations += 1
+                    removed += 1
+        return removed
+
+    def start_sweeper(self, interval: float, max_entries_per_tick: int = 1000) -> None:
+        """Starts a background thread that removes expired entries every `interval` seconds.
+
+        At most `max_entries_per_tick` entries are removed at a time so the store isn't locked for long; if more have
+        expired, the thread continues after a short pause instead of waiting for the next interval.
+        """
+        with self._lock:
+            if self._sweeper_stopped is not None:
+                return
+            self._sweeper_stopped = Event()
+            thread = Thread(
+                target=_sweep_periodically,
+                args=(
+                    weakref.ref(self),
+                    self._sweeper_stopped,
+                    interval,
+                    max_entries_per_tick,
+                ),
+                name="cassiopeia-cache-sweeper",
+                daemon=True,
+            )
+            thread.start()
+
+    def stop_sweeper(self) -> None:
+        with self._lock:
+            if self._sweeper_stopped is not None:
+                self._sweeper_stopped.set()
+                self._sweeper_stopped = None
+
+    def _schedule_expiration(self, type: Any, key: Any, expires: float) -> None:
+        if expires is None:
+            return
+        heappush(self._expirations, (expires, next(self._sequence), type, key))
+        # Drop the stale items once they outnumber the live entries
+        if len(self._expirations) > 2 * len(self._recency) + 1024:
+            self._expirations = [
+                (entry.expires, next(self._sequence), type, key)
+                for type, entries in self._data.items()
+                for key, entry in entries.items()
+                if entry.expires is not None
+            ]
+            heapify(self._expirations)
+
+    def _estimate(self, value: Any) -> int:
+        if self._max_bytes is None:
+            return 0
+        return approximate_size(value)
+
+    def _resize(self, stored: _Stored, size: int) -> None:
+        self._bytes += size - stored.size
+        stored.size = size
+
+    def _use(self, type: Any, stored: _Stored) -> None:
+        if type not in self._compress or stored.compressed:
+            return
+        self._hot[id(stored)] = stored
+        self._hot.move_to_end(id(stored))
+        while len(self._hot) > self._hot_entries:
+            self._deflate(self._hot.popitem(last=False)[1])
+
+    def _deflate(self, stored: _Stored) -> None:
+        try:
+            blob = zlib.compress(pickle.dumps(stored.value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return  # Values that can't be pickled stay as they are
+        del self._objects[(stored.type, id(stored.value))]
+        stored.value = blob
+        stored.compressed = True
+        self._resize(stored, 0 if self._max_bytes is None else sys.getsizeof(blob))
+
+    def _inflate(self, stored: _Stored) -> None:
+        value = pickle.loads(zlib.decompress(stored.value))
+        stored.value = value
+        stored.compressed = False
+        self._objects[(stored.type, id(value))] = stored
+        self._resize(stored, self._estimate(value))
+
+    def _stats_for(self, type: Any) -> CacheStats:
+        try:
+            return self._stats[type]
+        except KeyError:
+            stats = self._stats[type] = CacheStats()
+            return stats
+
+    def _canonical(self, type: Any, key: Any) -> Any:
+        """Returns the canonical key of the entry that `key` belongs to, or None."""
+        if key in self._data.get(type, ()):
+            return key
+        return self._aliases.get(type, {}).get(key)
+
+    def _alias(self, type: Any, alias: Any, key: Any) -> None:
+        if self._aliases.get(type, {}).get(alias) == key:
+            return
+        self._unlink(type, alias)
+        self._aliases.setdefault(type, {})[alias] = key
+        self._data[type][key].aliases.append(alias)
+
+    def _unlink(self, type: Any, key: Any) -> None:
+        """Frees up `key` for another entry."""
+        if key in self._data.get(type, ()):
+            self._remove(type, key)
+        else:
+            aliases = self._aliases.get(type, {})
+            if key in aliases:
+                self._data[type][aliases.pop(key)].aliases.remove(key)
+
+    def _touch(self, type: Any, key: Any) -> None:
+        self._data[type].move_to_end(key)
+        self._recency.move_to_end((type, key))
+
+    def _remove(self, type: Any, key: Any) -> _Entry:
+        entry = self._data[type].pop(key)
+        del self._recency[(type, key)]
+        if entry.aliases:
+            aliases = self._aliases[type]
+            for alias in entry.aliases:
+                del aliases[alias]
+        stored = entry.stored
+        stored.references -= 1
+        if stored.references == 0:
+            if not stored.compressed:
+                del self._objects[(stored.type, id(stored.value))]
+            self._hot.pop(id(stored), None)
+            self._bytes -= stored.size
+        return entry
+
+    def _evict(self, type: Any) -> None:
+        max_entries = self._max_entries.get(type, self._default_max_entries)
+        if max_entries is not None:
+            entries = self._data[type]
+            while len(entries) > max_entries:
+                self._remove(type, next(iter(entries)))
+                self._stats_for(type).evictions += 1
+        if self._max_bytes is not None:
+            while self._bytes > self._max_bytes and self._recency:
+                evicted_type, key = next(iter(self._recency))
+                self._remove(evicted_type, key)
+                self._stats_for(evicted_type).evictions += 1
+
+
+def _sweep_periodically(
+    reference: "weakref.ref[CacheStore]",
+    stopped: Event,
+    interval: float,
+    max_entries_per_tick: int,
+) -> None:
+    # Only holds a weak reference between ticks so the store can be garbage collected
+    wait = interval
+    while not stopped.wait(wait):
+        store = reference()
+        if store is None:
+            return
+        removed = store.sweep(max_entries_per_tick)
+        del store
+        wait = 0.01 if removed >= max_entries_per_tick else interval
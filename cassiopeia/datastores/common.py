@@ -1,9 +1,12 @@
 import re
+import time
 import zlib
+from collections import defaultdict
 from contextlib import contextmanager, ExitStack
 from io import BytesIO
-from typing import Mapping, MutableMapping, Any, Union, Dict, List
-from urllib.parse import urlencode
+from threading import Lock
+from typing import Mapping, MutableMapping, Any, Union, Dict, List, Callable
+from urllib.parse import urlencode, urlsplit
 
 try:
     from pycurl import Curl
@@ -27,6 +30,8 @@ try:
 except ImportError:
     import json
 
+from ..tracing import span
+
 
 _print_calls = True
 _print_api_key = False
@@ -39,24 +44,113 @@ class HTTPError(RuntimeError):
         self.response_headers = response_headers or {}
 
 
+class ConnectionPool(object):
+    """Keeps idle keep-alive connections per host so repeated calls skip the TCP + TLS handshake.
+
+    Connections are checked out exclusively, so a pooled connection is never used by two threads at once.
+    Connections that sat idle for longer than `idle_timeout` seconds are closed instead of being reused.
+    """
+
+    def __init__(
+        self,
+        new_connection: Callable[[], Any],
+        max_connections_per_host: int = 10,
+        idle_timeout: float = 60.0,
+    ):
+        self._new_connection = new_connection
+        self._max_connections_per_host = max_connections_per_host
+        self._idle_timeout = idle_timeout
+        self._idle = defaultdict(list)  # host -> [(connection, last used)]
+        self._lock = Lock()
+
+    @staticmethod
+    def _host(url: Union[str, bytes]) -> str:
+        if isinstance(url, bytes):
+            url = url.decode("ISO-8859-1")
+        return urlsplit(url).netloc
+
+    @contextmanager
+    def connection(self, url: Union[str, bytes]):
+        host = self._host(url)
+        connection = self._acquire(host)
+        try:
+            yield connection
+        except BaseException:
+            # The connection may be in an unknown state, so don't give it back to the pool.
+            connection.close()
+            raise
+        else:
+            self._release(host, connection)
+
+    def _acquire(self, host: str):
+        with self._lock:
+            self._evict_idle()
+            idle = self._idle[host]
+            if idle:
+                # Take the most recently used connection; it is the most likely to still be alive.
+                connection, _ = idle.pop()
+                return connection
+        return self._new_connection()
+
+    def _release(self, host: str, connection) -> None:
+        with self._lock:
+            idle = self._idle[host]
+            if len(idle) < self._max_connections_per_host:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def _evict_idle(self) -> None:
+        # Must be called while holding self._lock
+        if self._idle_timeout is None or self._idle_timeout < 0:
+            return
+        cutoff = time.monotonic() - self._idle_timeout
+        for host, idle in self._idle.items():
+            if idle and idle[0][1] < cutoff:
+                keep = []
+                for connection, last_used in idle:
+                    if last_used < cutoff:
+                        connection.close()
+                    else:
+                        keep.append((connection, last_used))
+                self._idle[host] = keep
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for connection, _ in idle:
+                    connection.close()
+            self._idle.clear()
+
+
 if USE_PYCURL:
 
     class HTTPClient(object):
+        def __init__(
+            self, max_connections_per_host: int = 10, idle_timeout: float = 60.0
+        ):
+            self._pool = ConnectionPool(
+                Curl,
+                max_connections_per_host=max_connections_per_host,
+                idle_timeout=idle_timeout,
+            )
+
         @staticmethod
-        def _execute(curl: Curl, close_connection: bool) -> int:
+        def _execute(curl: Curl) -> int:
             curl.perform()
-            status_code = curl.getinfo(curl.HTTP_CODE)
-            if close_connection:
-                curl.close()
-            return status_code
+            return curl.getinfo(curl.HTTP_CODE)
 
-        @staticmethod
         def _get(
+            self,
             url: str,
             headers: Mapping[str, str] = None,
             rate_limiters: List[RateLimiter] = None,
             connection: Curl = None,
         ) -> (int, bytes, dict):
+            if connection is None:
+                with self._pool.connection(url) as connection:
+                    return self._get(url, headers, rate_limiters, connection)
+
             if not headers:
                 request_headers = ["Accept-Encoding: gzip"]
             else:
@@ -80,7 +174,7 @@ if USE_PYCURL:
 
             buffer = BytesIO()
 
-            curl = connection if connection is not None else Curl()
+            curl = connection
 
             curl.setopt(curl.URL, url)
             curl.setopt(curl.WRITEDATA, buffer)
@@ -102,15 +196,20 @@ if USE_PYCURL:
             if rate_limiters:
                 with ExitStack() as stack:
                     # Enter each context manager / rate limiter
-                    limiters = [
-                        stack.enter_context(rate_limiter)
-                        for rate_limiter in rate_limiters
-                    ]
+                    with span("rate_limit_wait"):
+                        limiters = [
+                            stack.enter_context(rate_limiter)
+                            for rate_limiter in rate_limiters
+                        ]
                     exit_limiters = stack.pop_all().__exit__
-                    status_code = HTTPClient._execute(curl, connection is None)
+                    with span("http", url=url) as http_span:
+                        status_code = HTTPClient._execute(curl)
+                        http_span.set("status", status_code)
                 exit_limiters(None, None, None)
             else:
-                status_code = HTTPClient._execute(curl, connection is None)
+                with span("http", url=url) as http_span:
+                    status_code = HTTPClient._execute(curl)
+                    http_span.set("status", status_code)
 
             body = buffer.getvalue()
 
@@ -142,7 +241,7 @@ if USE_PYCURL:
                     parameters = urlencode(parameters, doseq=True)
                 url = "{url}?{params}".format(url=url, params=parameters)
 
-            status_code, body, response_headers = HTTPClient._get(
+            status_code, body, response_headers = self._get(
                 url, headers, rate_limiters, connection
             )
 
@@ -183,12 +282,26 @@ if USE_PYCURL:
 else:  # Use requests
 
     class HTTPClient(object):
-        @staticmethod
+        def __init__(
+            self, max_connections_per_host: int = 10, idle_timeout: float = 60.0
+        ):
+            self._pool = ConnectionPool(
+                requests.Session,
+                max_connections_per_host=max_connections_per_host,
+                idle_timeout=idle_timeout,
+            )
+
         def _get(
+            self,
             url: str,
             headers: Mapping[str, str] = None,
             rate_limiters: List[RateLimiter] = None,
-        ) -> (int, bytes, dict):
+            connection: requests.Session = None,
+        ) -> requests.Response:
+            if connection is None:
+                with self._pool.connection(url) as connection:
+                    return self._get(url, headers, rate_limiters, connection)
+
             if not headers:
                 request_headers = {"Accept-Encoding": "gzip"}
             else:
@@ -209,15 +322,20 @@ else:  # Use requests
             if rate_limiters:
                 with ExitStack() as stack:
                     # Enter each context manager / rate limiter
-                    limiters = [
-                        stack.enter_context(rate_limiter)
-                        for rate_limiter in rate_limiters
-                    ]
+                    with span("rate_limit_wait"):
+                        limiters = [
+                            stack.enter_context(rate_limiter)
+                            for rate_limiter in rate_limiters
+                        ]
                     exit_limiters = stack.pop_all().__exit__
-                    r = requests.get(url, headers=request_headers)
+                    with span("http", url=url) as http_span:
+                        r = connection.get(url, headers=request_headers)
+                        http_span.set("status", r.status_code)
                 exit_limiters(None, None, None)
             else:
-                r = requests.get(url, headers=request_headers)
+                with span("http", url=url) as http_span:
+                    r = connection.get(url, headers=request_headers)
+                    http_span.set("status", r.status_code)
 
             return r
 
@@ -239,8 +357,7 @@ else:  # Use requests
                     parameters = urlencode(parameters, doseq=True)
                 url = "{url}?{params}".format(url=url, params=parameters)
 
-            # status_code, body, response_headers = HTTPClient._get(url, headers, rate_limiters)
-            r = HTTPClient._get(url, headers, rate_limiters)
+            r = self._get(url, headers, rate_limiters, connection)
             response_headers = r.headers
 
             # Handle errors
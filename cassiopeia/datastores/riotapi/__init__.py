@@ -1,13 +1,25 @@
 from typing import Iterable, Set, Dict
+import atexit
+import hashlib
 import itertools
+import json
 import os
+import weakref
 
 from datapipelines import CompositeDataSource
 from .common import RiotAPIService, RiotAPIRateLimiter
 
 
 def _default_services(
-    api_key: str, limiting_share: float = 1.0, request_error_handling: Dict = None
+    api_key: str,
+    limiting_share: float = 1.0,
+    request_error_handling: Dict = None,
+    connection_pool: Dict = None,
+    max_concurrent_requests: int = 1,
+    ordered_results: bool = True,
+    rate_limiter: Dict = None,
+    retry_budget: Dict = None,
+    method_rate_limits: Dict = None,
 ) -> Set[RiotAPIService]:
     from ..common import HTTPClient
     from ..image import ImageDataSource
@@ -22,12 +34,25 @@ def _default_services(
     from .thirdpartycode import ThirdPartyCodeAPI
     from ...data import Platform, Continent
 
+    if rate_limiter is None:
+        rate_limiter = {"strategy": "fixed_window"}
+    if rate_limiter.get("strategy") == "shared_sliding_window":
+        # Processes using different API keys must not share buckets
+        rate_limiter = dict(rate_limiter)
+        rate_limiter.setdefault(
+            "namespace", hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        )
     app_rate_limiter = {
-        platform: RiotAPIRateLimiter(limiting_share=limiting_share)
+        platform: RiotAPIRateLimiter(
+            limiting_share=limiting_share,
+            name="{}-application".format(platform.value),
+            **rate_limiter
+        )
         for platform in itertools.chain(Platform, Continent)
     }
 
-    client = HTTPClient()
+    # One client (and therefore one pool of keep-alive connections per host) is shared by every service
+    client = HTTPClient(**(connection_pool or {}))
     services = {
         ImageDataSource(client),
         ChampionAPI(
@@ -35,60 +60,89 @@ def _default_services(
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         SummonerAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         AccountAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         ChampionMasteryAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         MatchAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
+            max_concurrent_requests=max_concurrent_requests,
+            ordered_results=ordered_results,
         ),
         SpectatorAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         StatusAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         LeaguesAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
         ThirdPartyCodeAPI(
             api_key,
             app_rate_limiter=app_rate_limiter,
             request_error_handling=request_error_handling,
             http_client=client,
+            retry_budget=retry_budget,
+            method_rate_limits=method_rate_limits,
         ),
     }
 
     return services
 
 
+def _save_rate_limiter_state(reference: "weakref.ref") -> None:
+    riotapi = reference()
+    if riotapi is not None:
+        try:
+            riotapi.save_rate_limiter_state()
+        except OSError:
+            pass  # Nothing can be done about it at exit; the next run starts from scratch
+
+
 class RiotAPI(CompositeDataSource):
     def __init__(
         self,
@@ -96,6 +150,13 @@ class RiotAPI(CompositeDataSource):
         services: Iterable[RiotAPIService] = None,
         limiting_share: float = 1.0,
         request_error_handling: Dict = None,
+        connection_pool: Dict = None,
+        max_concurrent_requests: int = 1,
+        ordered_results: bool = True,
+        rate_limiter: Dict = None,
+        retry_budget: Dict = None,
+        method_rate_limits: Dict = None,
+        rate_limiter_state_file: str = None,
     ) -> None:
         if api_key is None:
             api_key = "RIOT_API_KEY"  # Use this env variable.
@@ -107,10 +168,91 @@ class RiotAPI(CompositeDataSource):
                 api_key=api_key,
                 limiting_share=limiting_share,
                 request_error_handling=request_error_handling,
+                connection_pool=connection_pool,
+                max_concurrent_requests=max_concurrent_requests,
+                ordered_results=ordered_results,
+                rate_limiter=rate_limiter,
+                retry_budget=retry_budget,
+                method_rate_limits=method_rate_limits,
             )
 
         super().__init__(services)
 
+        # Limiter state is saved when the program exits and restored here, so a restarted program doesn't send a
+        # burst of requests before it has learned the rate limits from the response headers.
+        self._rate_limiter_state_file = rate_limiter_state_file
+        if rate_limiter_state_file is not None:
+            self.load_rate_limiter_state()
+            atexit.register(_save_rate_limiter_state, weakref.ref(self))
+
+    def _services(self) -> Set[RiotAPIService]:
+        return {
+            source
+            for sources in self._sources.values()
+            for source in sources
+            if isinstance(source, RiotAPIService)
+        }
+
+    def save_rate_limiter_state(self, filename: str = None) -> None:
+        if filename is None:
+            filename = self._rate_limiter_state_file
+        state = {"application": {}, "methods": {}}
+        for service in self._services():
+            for key, limiter in list(service._rate_limiters.items()):
+                if key == "application":
+                    for platform, app_limiter in limiter.items():
+                        snapshot = app_limiter.snapshot()
+                        if snapshot is not None:
+                            state["application"][platform.value] = snapshot
+                else:
+                    platform, endpoint = key
+                    snapshot = limiter.snapshot()
+                    if snapshot is not None:
+                        methods = state["methods"].setdefault(platform.value, {})
+                        methods[endpoint] = snapshot
+            # Keep the state of limiters that weren't used since it was loaded
+            for (platform, endpoint), snapshot in service._saved_rate_limiters.items():
+                methods = state["methods"].setdefault(platform, {})
+                methods.setdefault(endpoint, snapshot)
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary_filename, filename)
+
+    def load_rate_limiter_state(self, filename: str = None) -> None:
+        from ...data import Platform, Continent
+
+        if filename is None:
+            filename = self._rate_limiter_state_file
+        try:
+            with open(filename) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return  # Start from scratch if there is no usable state
+
+        services = self._services()
+        saved_methods = {
+            (platform, endpoint): snapshot
+            for platform, endpoints in state.get("methods", {}).items()
+            for endpoint, snapshot in endpoints.items()
+        }
+        for service in services:
+            service._saved_rate_limiters = saved_methods
+        if services:
+            app_limiters = next(iter(services))._rate_limiters["application"]
+            for platform in itertools.chain(Platform, Continent):
+                snapshot = state.get("application", {}).get(platform.value)
+                if snapshot is not None:
+                    app_limiters[platform].restore(snapshot)
+
+    def close(self) -> None:
+        """Shuts down the threads used to request matches concurrently."""
+        from .match import MatchAPI
+
+        for service in self._services():
+            if isinstance(service, MatchAPI):
+                service.close()
+
     def set_api_key(self, key: str):
         for sources in self._sources.values():
             for source in sources:
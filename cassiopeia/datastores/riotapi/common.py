@@ -1,8 +1,15 @@
 import time
 import copy
+import heapq
 import functools
+import itertools
 import collections.abc
 from abc import abstractmethod, ABC
+from collections import deque
+from contextvars import ContextVar
+from math import ceil
+from threading import Condition, Lock, Thread
+from time import monotonic
 from typing import (
     MutableMapping,
     Any,
@@ -17,10 +24,19 @@ from typing import (
 )
 
 from datapipelines import DataSource, PipelineContext
-from merakicommons.ratelimits import FixedWindowRateLimiter, MultiRateLimiter
+from merakicommons.ratelimits import MultiRateLimiter, RateLimiter
 
 from ..common import HTTPClient, HTTPError, Curl
+from ...tracing import span
 from ...data import Platform
+from .ratelimits import (
+    PriorityGate,
+    get_request_priority,
+    SynchronizedFixedWindowRateLimiter,
+    SlidingWindowRateLimiter,
+    GCRARateLimiter,
+    SharedSlidingWindowRateLimiter,
+)
 from ...dto.staticdata.realm import RealmDto
 
 
@@ -70,28 +86,102 @@ _ERROR_CODES = {
 T = TypeVar("T")
 
 
+_RATE_LIMITER_STRATEGIES = {
+    "fixed_window": SynchronizedFixedWindowRateLimiter,
+    "sliding_window": SlidingWindowRateLimiter,
+    "gcra": GCRARateLimiter,
+    "shared_sliding_window": SharedSlidingWindowRateLimiter,
+}
+
+
+# The method rate limits that Riot publishes for each endpoint, as (permits, window in seconds), so method limiters
+# don't have to wait for the first response headers. The headers still take precedence if Riot changes a limit.
+# Endpoints that also depend on the platform (e.g. "masterleagues/by-queue NA1") are looked up without it.
+DEFAULT_METHOD_RATE_LIMITS = {
+    "accounts/by-puuid/puuid": [(1000, 60)],
+    "accounts/by-riot-id/gameName/tagLine": [(1000, 60)],
+    "champion/rotations": [(30, 10), (500, 600)],
+    "champion-masteries/by-summoner/summonerId": [(20000, 10), (1200000, 600)],
+    "champion-masteries/by-summoner/summonerId/by-champion/championId": [
+        (20000, 10),
+        (1200000, 600),
+    ],
+    "scores/by-summoner/summonerId": [(20000, 10), (1200000, 600)],
+    "leagues/paginated-entries": [(50, 10)],
+    "leagues/summoner-entries": [(20000, 10), (1200000, 600)],
+    "leagues/leagueId": [(500, 10)],
+    "challengerleagues/by-queue": [(30, 10), (500, 600)],
+    "grandmasterleagues/by-queue": [(30, 10), (500, 600)],
+    "masterleagues/by-queue": [(30, 10), (500, 600)],
+    "matches/id": [(2000, 10)],
+    "matches/id/timeline": [(2000, 10)],
+    "matchlists/by-puuid/puuid": [(2000, 10)],
+    "spectator/active-games/by-summoner": [(20000, 10), (1200000, 600)],
+    "featured-games": [(20000, 10), (1200000, 600)],
+    "status": [(20000, 10), (1200000, 600)],
+    "summoners/summonerId": [(1600, 60)],
+    "summoners/by-account/accountId": [(1600, 60)],
+    "summoners/by-name/name": [(1600, 60)],
+    "summoners/by-puuid/puuid": [(1600, 60)],
+}
+
+
 class RiotAPIRateLimiter(MultiRateLimiter):
     # The application limiter and method limiters will each be an instance of this.
 
-    def __init__(self, limiting_share):
+    def __init__(
+        self,
+        limiting_share,
+        strategy: str = "fixed_window",
+        name: str = None,
+        **strategy_args
+    ):
         self.limiting_share = limiting_share
+        self.name = name
+        if strategy not in _RATE_LIMITER_STRATEGIES:
+            raise ValueError(
+                "Unknown rate limiter strategy {}; valid values are {}.".format(
+                    strategy, list(_RATE_LIMITER_STRATEGIES)
+                )
+            )
+        self.strategy = strategy
+        self.strategy_args = strategy_args
         super().__init__()  # Initialize with no underlying limiters
         self._limiters = []  # Make it a list rather than a tuple so we can append
+        # Only one request at a time waits on the underlying limiters; the others queue here by priority
+        self._gate = PriorityGate()
+        self._raw_limits = None  # The limits from the most recent response headers
+
+    def __enter__(self) -> "RiotAPIRateLimiter":
+        with self._gate.turn(get_request_priority()):
+            return super().__enter__()
+
+    def empty_copy(self, name: str = None) -> "RiotAPIRateLimiter":
+        # A new limiter with the same settings as this one but without any underlying limiters
+        return RiotAPIRateLimiter(
+            self.limiting_share, self.strategy, name=name, **self.strategy_args
+        )
 
     def restrict_for(self, seconds: int) -> None:
         for limiter in self._limiters:
             limiter.restrict_for(seconds)
 
     def _construct_limiters(self, limits: List[List[int]]):
-        # Creates the necessary FixedWindowRateLimiters from the rates in the headers
+        # Creates the necessary underlying limiters from the rates in the headers
         assert len(self._limiters) == 0
+        limiter_cls = _RATE_LIMITER_STRATEGIES[self.strategy]
         # Create the rate limiters
         for permits, window in limits:
+            kwargs = dict(self.strategy_args)
+            if getattr(limiter_cls, "requires_name", False):
+                # Limiters shared between processes are identified by platform, endpoint, and window
+                kwargs["name"] = "{}-{}s".format(self.name, window)
             self._limiters.append(
-                FixedWindowRateLimiter(window_seconds=window, window_permits=permits)
+                limiter_cls(window_seconds=window, window_permits=permits, **kwargs)
             )
 
     def adjust_rate_limits_if_necessary(self, limits: List[List[int]]) -> None:
+        self._raw_limits = [list(limit) for limit in limits]
         if len(self._limiters) == 0:
             self._construct_limiters(limits)
         for permits, window in limits:
@@ -104,7 +194,48 @@ class RiotAPIRateLimiter(MultiRateLimiter):
             if permits != for_window._window_permits:
                 for_window.set_permits(permits)
 
-    def _get_specific_limiter_for_window(self, window: int) -> FixedWindowRateLimiter:
+    def reconcile_counts(self, counts: List[List[int]]) -> None:
+        # Brings the limiters in line with the number of permits the server says were used in each window
+        for used, window in counts:
+            if self.limiting_share < 1 and used > 1:
+                # The count includes other clients' requests, which the share already leaves room for, so only
+                # this process's share of them is charged. The request this response is for counts in full.
+                used = 1 + ceil((used - 1) * self.limiting_share)
+            for_window = self._get_specific_limiter_for_window(window)
+            if for_window is not None and hasattr(for_window, "reconcile"):
+                for_window.reconcile(used)
+
+    def snapshot(self) -> Dict:
+        # The state needed to pick up where this limiter left off, e.g. after a restart. Times are wall clock times.
+        if self._raw_limits is None:
+            return None
+        now = time.time()
+        windows = {}
+        for limiter in self._limiters:
+            if hasattr(limiter, "usage"):
+                used, restricted_for = limiter.usage()
+                windows[str(limiter._window_seconds)] = {
+                    "used": used,
+                    "restricted_until": now + restricted_for,
+                }
+        return {"limits": self._raw_limits, "windows": windows, "saved_at": now}
+
+    def restore(self, snapshot: Dict) -> None:
+        self.adjust_rate_limits_if_necessary(snapshot["limits"])
+        now = time.time()
+        age = now - snapshot["saved_at"]
+        for window, state in snapshot["windows"].items():
+            for_window = self._get_specific_limiter_for_window(int(window))
+            if for_window is None or not hasattr(for_window, "reconcile"):
+                continue
+            restricted_for = state["restricted_until"] - now
+            if restricted_for > 0:
+                for_window.restrict_for(restricted_for)
+            elif age < int(window) and state["used"] > 0:
+                # The permits may still count against the server's window, so assume they were just used
+                for_window.reconcile(state["used"])
+
+    def _get_specific_limiter_for_window(self, window: int) -> RateLimiter:
         for limiter in self._limiters:
             if limiter._window_seconds == window:
                 return limiter
@@ -127,6 +258,8 @@ class RiotAPIService(DataSource):
         app_rate_limiter: Dict[Platform, RiotAPIRateLimiter],
         request_error_handling: Dict = None,
         http_client: HTTPClient = None,
+        retry_budget: Dict = None,
+        method_rate_limits: Dict = None,
     ):
         self._limiting_share = app_rate_limiter[Platform.north_america].limiting_share
 
@@ -140,6 +273,19 @@ class RiotAPIService(DataSource):
         # Both the application and method rate limiters will be in the same rate limiter
         self._rate_limiters = {"application": app_rate_limiter}
 
+        # {"max_retries": ..., "window_seconds": ...} for each endpoint, or None to only limit retries per request
+        self._retry_budget = retry_budget
+        self._retry_budgets = {}  # type: Dict[RiotAPIRateLimiter, RetryBudget]
+        self._retry_budgets_lock = Lock()
+
+        # Overrides of the known method rate limits; an endpoint set to None is left to the response headers
+        self._method_rate_limits = dict(DEFAULT_METHOD_RATE_LIMITS)
+        if method_rate_limits is not None:
+            self._method_rate_limits.update(method_rate_limits)
+
+        # Snapshots of method limiters from a previous run, by platform and endpoint (see RiotAPI)
+        self._saved_rate_limiters = {}  # type: Dict[Tuple[str, str], Dict]
+
         default_request_error_handling = {
             "404": {"strategy": "throw"},
             "429": {
@@ -213,22 +359,49 @@ class RiotAPIService(DataSource):
         try:
             method_limiter = self._rate_limiters[(platform, endpoint)]
         except KeyError:
-            method_limiter = RiotAPIRateLimiter(self._limiting_share)
+            method_limiter = self._rate_limiters["application"][platform].empty_copy(
+                name="{}-{}".format(platform.value, endpoint)
+            )
+            limits = self._method_rate_limits.get(endpoint.split(" ")[0])
+            if limits:
+                method_limiter.adjust_rate_limits_if_necessary(limits)
+            snapshot = self._saved_rate_limiters.pop((platform.value, endpoint), None)
+            if snapshot is not None:
+                method_limiter.restore(snapshot)
             self._rate_limiters[(platform, endpoint)] = method_limiter
         app_limiter = self._rate_limiters["application"][platform]
         return app_limiter, method_limiter
 
+    def _get_retry_budget(self, method_limiter: RiotAPIRateLimiter) -> "RetryBudget":
+        if self._retry_budget is None or method_limiter is None:
+            return None
+        with self._retry_budgets_lock:
+            try:
+                return self._retry_budgets[method_limiter]
+            except KeyError:
+                budget = RetryBudget(**self._retry_budget)
+                self._retry_budgets[method_limiter] = budget
+                return budget
+
     def _adjust_rate_limiters_from_headers(
         self, app_limiter, method_limiter, response_headers
     ):
         # If Riot changes the # of permits allowed in their response headers, change our rate limiters.
-        # We are currently ignoring the X-*-Rate-Limit-Count headers and assuming our rate limiter logic agrees.
+        # The X-*-Rate-Limit-Count headers are used to resynchronize the limiters that support it.
         if "X-App-Rate-Limit" in response_headers:
             limits = _split_rate_limit_header(response_headers["X-App-Rate-Limit"])
             app_limiter.adjust_rate_limits_if_necessary(limits)
+        if "X-App-Rate-Limit-Count" in response_headers:
+            counts = _split_rate_limit_header(response_headers["X-App-Rate-Limit-Count"])
+            app_limiter.reconcile_counts(counts)
         if "X-Method-Rate-Limit" in response_headers:
             limits = _split_rate_limit_header(response_headers["X-Method-Rate-Limit"])
             method_limiter.adjust_rate_limits_if_necessary(limits)
+        if "X-Method-Rate-Limit-Count" in response_headers:
+            counts = _split_rate_limit_header(
+                response_headers["X-Method-Rate-Limit-Count"]
+            )
+            method_limiter.reconcile_counts(counts)
 
     def _get(
         self,
@@ -241,6 +414,8 @@ class RiotAPIService(DataSource):
         # Make a new RiotAPIRequest and run it until it returns or fails.
         # If it returns, return the result.
         # If it fails, throw an appropriate error.
+        # If the caller can park failed requests, RetryLater is raised instead of sleeping before a retry.
+        deferred_retry_handlers = _deferred_retry_handlers.get()
         request = RiotAPIRequest(
             service=self,
             url=url,
@@ -248,8 +423,12 @@ class RiotAPIService(DataSource):
             app_limiter=app_limiter,
             method_limiter=method_limiter,
             connection=connection,
+            retry_budget=self._get_retry_budget(method_limiter),
+            handlers=deferred_retry_handlers,
         )
         try:
+            if deferred_retry_handlers is not None:
+                return request.attempt()
             return request()
         except HTTPError as error:
             # The error handlers didn't work, so raise an appropriate error.
@@ -312,6 +491,21 @@ class RiotAPIService(DataSource):
         pass
 
 
+class RetryLater(Exception):
+    # Raised by RiotAPIRequest.attempt when the request failed but may succeed if it's retried after `delay` seconds.
+    def __init__(self, delay: float, error: HTTPError):
+        super().__init__(
+            "Request failed with {}; retry in {} seconds.".format(error.code, delay)
+        )
+        self.delay = delay
+        self.error = error
+
+
+# Callers that can park a failed request (see RetryScheduler) rather than sleeping in the current thread set this to
+# a list, which holds the error handlers used by the previous attempts at the request.
+_deferred_retry_handlers = ContextVar("cassiopeia_deferred_retry_handlers", default=None)
+
+
 class RiotAPIRequest(object):
     def __init__(
         self,
@@ -321,6 +515,8 @@ class RiotAPIRequest(object):
         app_limiter: RiotAPIRateLimiter,
         method_limiter: RiotAPIRateLimiter,
         connection: Curl,
+        retry_budget: "RetryBudget" = None,
+        handlers: List["FailedRequestHandler"] = None,
     ):
         self.service = service
         self.url = url
@@ -328,8 +524,22 @@ class RiotAPIRequest(object):
         self.app_limiter = app_limiter
         self.method_limiter = method_limiter
         self.connection = connection
+        self.retry_budget = retry_budget
+        self.handlers = handlers if handlers is not None else []
 
     def __call__(self):
+        # Blocks the calling thread until the request succeeds or the error handlers give up.
+        while True:
+            try:
+                return self.attempt()
+            except RetryLater as retry:
+                with span(
+                    "retry_wait", status=retry.error.code, seconds=retry.delay
+                ):
+                    time.sleep(retry.delay)
+
+    def attempt(self):
+        # Makes the request once. Raises RetryLater if it should be retried, or the HTTPError if it shouldn't be.
         try:
             body, response_headers = self.service._client.get(
                 url=self.url,
@@ -338,19 +548,17 @@ class RiotAPIRequest(object):
                 rate_limiters=[self.app_limiter, self.method_limiter],
                 connection=self.connection,
             )
-            self.service._adjust_rate_limiters_from_headers(
-                app_limiter=self.app_limiter,
-                method_limiter=self.method_limiter,
-                response_headers=response_headers,
-            )
-            return body
         except HTTPError as error:
-            return self._retry_request_by_handling_error(error)
+            raise RetryLater(self._handle_error(error), error) from error
+        self.service._adjust_rate_limiters_from_headers(
+            app_limiter=self.app_limiter,
+            method_limiter=self.method_limiter,
+            response_headers=response_headers,
+        )
+        return body
 
-    def _retry_request_by_handling_error(self, error: HTTPError, handlers=None):
-        if handlers is None:
-            handlers = []
-        # Try to properly handling the 429 and retry the call after the appropriate time limit.
+    def _handle_error(self, error: HTTPError) -> float:
+        # Returns the number of seconds to wait before retrying, or raises the error if it shouldn't be retried.
         if error.code == 429:
             # Identify which rate limit was hit (application, method, or service)
             if "X-Rate-Limit-Type" not in error.response_headers:
@@ -376,41 +584,29 @@ class RiotAPIRequest(object):
             new_handler = self.service._handlers[error.code]()
 
         # If we will handle the new error in the same way as we did previously, don't use a new instance
-        for handler in handlers:
+        for handler in self.handlers:
             if isinstance(new_handler, handler.__class__):
                 new_handler = handler
                 break
 
         if new_handler.stop:
             raise error
-        else:
-            try:
-                body, response_headers = new_handler(
-                    error=error,
-                    requester=self.service._client.get,
-                    url=self.url,
-                    parameters=self.parameters,
-                    headers=self.service._headers,
-                    rate_limiters=[self.app_limiter, self.method_limiter],
-                    connection=self.connection,
-                )
-                self.service._adjust_rate_limiters_from_headers(
-                    app_limiter=self.app_limiter,
-                    method_limiter=self.method_limiter,
-                    response_headers=response_headers,
-                )
-                return body
-            except HTTPError as error:
-                if new_handler not in handlers:
-                    handlers.append(new_handler)
-                return self._retry_request_by_handling_error(error, handlers=handlers)
+        delay = new_handler(
+            error=error,
+            headers=self.service._headers,
+            rate_limiters=[self.app_limiter, self.method_limiter],
+        )
+        if new_handler not in self.handlers:
+            self.handlers.append(new_handler)
+        if self.retry_budget is not None and not self.retry_budget.withdraw():
+            raise error
+        return delay
 
 
 class FailedRequestHandler(ABC):
     @abstractmethod
-    def __call__(
-        self, error, requester, url, parameters, headers, rate_limiters, connection
-    ) -> Tuple[Union[dict, list, str, bytes], dict]:
+    def __call__(self, error, headers, rate_limiters) -> float:
+        # Returns the number of seconds to wait before retrying, or raises the error to stop retrying.
         pass
 
 
@@ -422,9 +618,7 @@ class ExponentialBackoff(FailedRequestHandler):
         self.attempts = 0
         self.stop = False
 
-    def __call__(
-        self, error, requester, url, parameters, headers, rate_limiters, connection
-    ) -> Tuple[Union[dict, list, str, bytes], dict]:
+    def __call__(self, error, headers, rate_limiters) -> float:
         if self.attempts >= self.max_attempts:
             self.stop = True
             raise error
@@ -433,10 +627,10 @@ class ExponentialBackoff(FailedRequestHandler):
                 headers.get("X-Rate-Limit-Type", "service"), error.code, self.backoff
             )
         )
-        time.sleep(self.backoff)
+        backoff = self.backoff
         self.backoff = self.backoff * self.factor
         self.attempts += 1
-        return requester(url, parameters, headers, rate_limiters, connection)
+        return backoff
 
 
 class RetryFromHeaders(object):
@@ -445,9 +639,7 @@ class RetryFromHeaders(object):
         self.attempts = 0
         self.stop = False
 
-    def __call__(
-        self, error, requester, url, parameters, headers, rate_limiters, connection
-    ) -> Tuple[Union[dict, list, str, bytes], dict]:
+    def __call__(self, error, headers, rate_limiters) -> float:
         if self.attempts >= self.max_attempts:
             self.stop = True
             raise error
@@ -460,14 +652,76 @@ class RetryFromHeaders(object):
         for rate_limiter in rate_limiters:
             rate_limiter.restrict_for(backoff)
         self.attempts += 1
-        return requester(url, parameters, headers, rate_limiters, connection)
+        return backoff
 
 
 class ThrowException(FailedRequestHandler):
     def __init__(self):
         self.stop = True
 
-    def __call__(
-        self, error, requester, url, parameters, headers, rate_limiters, connection
-    ) -> Tuple[Union[dict, list, str, bytes], dict]:
+    def __call__(self, error, headers, rate_limiters) -> float:
         raise error
+
+
+class RetryBudget(object):
+    """Allows at most `max_retries` retries in any `window_seconds` long interval.
+
+    Each endpoint has its own budget, so an outage of one endpoint can't fill the rate limits with retries.
+    """
+
+    def __init__(self, max_retries: int, window_seconds: float):
+        self._max_retries = max_retries
+        self._window_seconds = window_seconds
+        self._retries = deque()
+        self._lock = Lock()
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = monotonic()
+            while self._retries and self._retries[0] <= now - self._window_seconds:
+                self._retries.popleft()
+            if len(self._retries) >= self._max_retries:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryScheduler(object):
+    """Runs callbacks after a delay on one background thread, so that waiting to retry doesn't occupy a worker.
+
+    Callbacks should be quick (e.g. submit the retry to an executor).
+    """
+
+    def __init__(self):
+        self._condition = Condition()
+        self._scheduled = []  # Heap of (due, sequence, callback)
+        self._sequence = itertools.count()
+        self._thread = None
+
+    def schedule(self, delay: float, callback: Callable[[], Any]) -> None:
+        with self._condition:
+            heapq.heappush(
+                self._scheduled, (monotonic() + delay, next(self._sequence), callback)
+            )
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="cassiopeia-retries", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    now = monotonic()
+                    if self._scheduled and self._scheduled[0][0] <= now:
+                        break
+                    timeout = self._scheduled[0][0] - now if self._scheduled else None
+                    self._condition.wait(timeout)
+                _, _, callback = heapq.heappop(self._scheduled)
+            try:
+                callback()
+            except Exception:
+                # e.g. the executor was shut down; the retry is dropped but the other retries still have to run
+                pass
@@ -1,4 +1,10 @@
 from typing import Type, TypeVar, MutableMapping, Any, Iterable, Generator
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from collections import deque
+from threading import Condition, Lock
+import contextvars
+import functools
+import weakref
 import arrow
 import datetime
 import math
@@ -11,7 +17,13 @@ from datapipelines import (
     validate_query,
 )
 
-from .common import RiotAPIService, APINotFoundError
+from .common import (
+    RiotAPIService,
+    APINotFoundError,
+    RetryLater,
+    RetryScheduler,
+    _deferred_retry_handlers,
+)
 from ...data import Continent, Region, Platform, MatchType, Queue, QUEUE_IDS
 from ...dto.match import MatchDto, MatchListDto, TimelineDto
 from ..uniquekeys import convert_region_to_platform, convert_to_continent
@@ -20,6 +32,46 @@ T = TypeVar("T")
 
 
 class MatchAPI(RiotAPIService):
+    def __init__(
+        self,
+        *args,
+        max_concurrent_requests: int = 1,
+        ordered_results: bool = True,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        # Number of matches requested in parallel by get_many, and whether they are yielded in the order requested
+        # or as soon as they arrive. The rate limiters still gate every request.
+        self._max_concurrent_requests = max_concurrent_requests
+        self._ordered_results = ordered_results
+        self._executor = None
+        self._executor_finalizer = None
+        self._executor_lock = Lock()
+        self._retry_scheduler = RetryScheduler()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    executor = ThreadPoolExecutor(
+                        max_workers=self._max_concurrent_requests,
+                        thread_name_prefix="cassiopeia-match",
+                    )
+                    # Stop the worker threads once this service is garbage collected, or at exit
+                    self._executor_finalizer = weakref.finalize(
+                        self, executor.shutdown, wait=False
+                    )
+                    self._executor = executor
+        return self._executor
+
+    def close(self) -> None:
+        """Shuts down the threads that request matches concurrently. New ones are started if they're needed again."""
+        with self._executor_lock:
+            finalizer = self._executor_finalizer
+            self._executor = self._executor_finalizer = None
+        if finalizer is not None:
+            finalizer()
+
     @DataSource.dispatch
     def get(
         self,
@@ -52,9 +104,10 @@ class MatchAPI(RiotAPIService):
     def get_match(
         self, query: MutableMapping[str, Any], context: PipelineContext = None
     ) -> MatchDto:
-        platform: Platform = query["platform"]
+        return self._get_match_dto(query["platform"], query["id"])
+
+    def _get_match_dto(self, platform: Platform, id: int) -> MatchDto:
         continent = platform.continent
-        id = query["id"]
         url = f"https://{continent.value.lower()}.api.riotgames.com/lol/match/v5/matches/{platform.value}_{id}"
         try:
             app_limiter, method_limiter = self._get_rate_limiter(
@@ -69,7 +122,7 @@ class MatchAPI(RiotAPIService):
             raise NotFoundError(str(error)) from error
 
         data["continent"] = continent.value
-        data["matchId"] = query["id"]
+        data["matchId"] = id
         for p in data["participants"]:
             puuid = p.get("puuid", None)
             if puuid is None:  # TODO: Figure out what bots are marked as in match-v5
@@ -93,36 +146,103 @@ class MatchAPI(RiotAPIService):
         self, query: MutableMapping[str, Any], context: PipelineContext = None
     ) -> Generator[MatchDto, None, None]:
         platform: Platform = query["platform"]
-        continent = platform.continent
 
         def generator():
             for id in query["ids"]:
-                url = f"https://{continent.value.lower()}.api.riotgames.com/lol/match/v5/matches/{platform.value}_{id}"
+                yield self._get_match_dto(platform, id)
+
+        def concurrent_generator():
+            # Make at most `max_concurrent_requests` requests at once so that a consumer who stops early doesn't
+            # trigger requests for the remaining ids. Requests that are waiting to be retried don't count towards
+            # that, so a few failing requests don't stall the others; up to as many again may be waiting.
+            executor = self._get_executor()
+            limit = self._max_concurrent_requests
+            ids = iter(query["ids"])
+            pending = deque()
+            changed = Condition()
+            counts = {"active": 0, "parked": 0}
+
+            def run(future: Future, call_context: contextvars.Context, id: int):
                 try:
-                    app_limiter, method_limiter = self._get_rate_limiter(
-                        continent, "matches/id"
-                    )
-                    data = self._get(
-                        url, {}, app_limiter=app_limiter, method_limiter=method_limiter
-                    )
-                    # metadata = data["metadata"]
-                    data = data["info"]  # Drop the metadata
-                except APINotFoundError as error:
-                    raise NotFoundError(str(error)) from error
-
-                for p in data["participants"]:
-                    puuid = p.get("puuid", None)
-                    if (
-                        puuid is None
-                    ):  # TODO: Figure out what bots are marked as in match-v5
-                        p["bot"] = True
+                    if future.cancelled():
+                        return
+                    try:
+                        match = call_context.run(self._get_match_dto, platform, id)
+                    except RetryLater as retry:
+                        # Park the request so the worker can make other requests while this one waits
+                        with changed:
+                            counts["parked"] += 1
+                        self._retry_scheduler.schedule(
+                            retry.delay,
+                            functools.partial(resume, future, call_context, id),
+                        )
+                    except BaseException as error:
+                        future.set_exception(error)
                     else:
-                        p["bot"] = False
-
-                data["matchId"] = id
-                data["continent"] = continent.value
-                yield MatchDto(data)
-
+                        future.set_result(match)
+                except InvalidStateError:  # Cancelled while the request was running
+                    pass
+                finally:
+                    with changed:
+                        counts["active"] -= 1
+                        changed.notify()
+
+            def resume(future: Future, call_context: contextvars.Context, id: int):
+                # Runs on the retry scheduler's thread, so errors have to be handed to the consumer through the future
+                with changed:
+                    counts["parked"] -= 1
+                    counts["active"] += 1
+                try:
+                    executor.submit(run, future, call_context, id)
+                except BaseException as error:  # e.g. the executor was shut down
+                    try:
+                        future.set_exception(error)
+                    except InvalidStateError:  # Cancelled while the request was parked
+                        pass
+                    with changed:
+                        counts["active"] -= 1
+                        changed.notify()
+
+            def submit_next() -> bool:
+                # Called while holding `changed`
+                for id in ids:
+                    future = Future()
+                    call_context = contextvars.copy_context()
+                    call_context.run(_deferred_retry_handlers.set, [])
+                    counts["active"] += 1
+                    executor.submit(run, future, call_context, id)
+                    pending.append(future)
+                    return True
+                return False
+
+            exhausted = False
+            try:
+                while True:
+                    with changed:
+                        while (
+                            not exhausted
+                            and counts["active"] < limit
+                            and counts["parked"] < limit
+                        ):
+                            exhausted = not submit_next()
+                        if not pending:
+                            return
+                        if self._ordered_results:
+                            done = [pending[0]] if pending[0].done() else []
+                        else:
+                            done = [future for future in pending if future.done()]
+                        if not done:
+                            changed.wait()
+                            continue
+                    for future in done:
+                        pending.remove(future)
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        if self._max_concurrent_requests > 1:
+            return concurrent_generator()
         return generator()
 
     _validate_get_match_list_query = (
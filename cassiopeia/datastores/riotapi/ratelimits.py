@@ -0,0 +1,493 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from heapq import heappush, heappop
+from itertools import count
+from math import ceil, floor
+from threading import Condition, Lock, Timer, local
+from time import monotonic, sleep
+import os
+import re
+import struct
+import tempfile
+import time
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from merakicommons.ratelimits import RateLimiter, FixedWindowRateLimiter
+
+
+_request_priority = ContextVar("cassiopeia_request_priority", default=0)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Requests made inside this context wait in line ahead of requests with a lower priority (the default is 0).
+
+    The priority is a context variable, so it follows the call into threads started by Cass.
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def get_request_priority() -> int:
+    return _request_priority.get()
+
+
+class PriorityGate(object):
+    """Lets waiting callers through one at a time, highest priority first and in arrival order within a priority."""
+
+    def __init__(self):
+        self._condition = Condition()
+        self._waiting = []  # Heap of (-priority, arrival)
+        self._arrivals = count()
+        self._busy = False
+
+    @contextmanager
+    def turn(self, priority: int):
+        with self._condition:
+            ticket = (-priority, next(self._arrivals))
+            heappush(self._waiting, ticket)
+            while self._busy or self._waiting[0] != ticket:
+                self._condition.wait()
+            heappop(self._waiting)
+            self._busy = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    @property
+    def waiting(self) -> int:
+        with self._condition:
+            return len(self._waiting)
+
+
+class _BlockingRateLimiter(RateLimiter, ABC):
+    # Shared plumbing for limiters that compute how long a caller has to wait for a permit.
+
+    def __init__(self, window_seconds: int, window_permits: float, timeout: float = -1):
+        self._window_seconds = window_seconds
+        self._window_permits = window_permits
+        self._timeout = timeout
+
+        self._condition = Condition()
+        self._restricted_until = 0.0
+        self._total_permits_issued = 0
+
+    @abstractmethod
+    def _wait_time(self, now: float) -> float:
+        # Returns the number of seconds until a permit may be available, 0 if one is available now, or None if
+        # the wait depends on a request that is still in flight. Called while holding self._condition.
+        pass
+
+    @abstractmethod
+    def _take_permit(self, now: float) -> None:
+        # Called while holding self._condition once _wait_time returned 0.
+        pass
+
+    def __enter__(self) -> "_BlockingRateLimiter":
+        deadline = None if self._timeout < 0 else monotonic() + self._timeout
+        with self._condition:
+            while True:
+                now = monotonic()
+                wait = self._wait_time(now)
+                if wait == 0:
+                    break
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError("Rate Limiter timed out!")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+            self._take_permit(now)
+            self._total_permits_issued += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    def set_permits(self, permits: float) -> None:
+        with self._condition:
+            self._window_permits = permits
+            self._condition.notify_all()
+
+    def restrict_for(self, seconds: float) -> None:
+        with self._condition:
+            self._restricted_until = monotonic() + seconds
+            self._condition.notify_all()
+
+    @abstractmethod
+    def reconcile(self, used: int) -> None:
+        """Accounts for `used` permits that the server counted in its current window."""
+        pass
+
+    @abstractmethod
+    def _used(self, now: float) -> int:
+        # Called while holding self._condition
+        pass
+
+    def usage(self) -> Tuple[int, float]:
+        # The permits used in the last window, and the seconds left on the current restriction
+        with self._condition:
+            now = monotonic()
+            return self._used(now), max(0.0, self._restricted_until - now)
+
+    @property
+    def permits_issued(self) -> int:
+        with self._condition:
+            return self._total_permits_issued
+
+    def reset_permits_issued(self) -> None:
+        with self._condition:
+            self._total_permits_issued = 0
+
+
+class SynchronizedFixedWindowRateLimiter(FixedWindowRateLimiter):
+    """A fixed-window limiter that can be brought back in line with the server's view of the window.
+
+    `reconcile` removes permits that the server says were used elsewhere (another client, or this process before a
+    restart). When the server reports the first request of a new window, the local window is restarted so it's in
+    phase with the server's.
+    """
+
+    def __init__(self, window_seconds: int, window_permits: int, timeout: int = -1):
+        super().__init__(window_seconds, window_permits, timeout)
+        self._restricted_until = 0.0
+
+    def _restart_window(self) -> None:
+        # Must be called while holding self._resetter_lock
+        if self._resetter:
+            self._resetter.cancel()
+            self._resetter.cancelled = True
+        self._resetter = Timer(self._window_seconds, self._reset)
+        self._resetter.cancelled = False
+        self._resetter.daemon = True
+        self._resetter.start()
+
+    def restrict_for(self, seconds: int) -> None:
+        super().restrict_for(seconds)
+        self._restricted_until = monotonic() + seconds
+
+    def usage(self) -> Tuple[int, float]:
+        # The permits used in the current window, and the seconds left on the current restriction
+        with self._resetter_lock:
+            restricted_for = max(0.0, self._restricted_until - monotonic())
+            if not self._resetter:
+                return 0, restricted_for
+            used = floor(self._window_permits) - self._permitter._permits
+            return max(0, used), restricted_for
+
+    def reconcile(self, used: int) -> None:
+        with self._resetter_lock:
+            if monotonic() < self._restricted_until:
+                return
+            with self._currently_processing_lock:
+                in_flight = self._currently_processing
+            available = floor(max(0, self._window_permits - used - in_flight))
+            current = self._permitter._permits
+            if used == 1:
+                # Our request was the first the server counted in its window, so the windows are now in phase
+                self._restart_window()
+            elif not self._resetter:
+                # Any drained permits have to come back at the end of the window
+                self._restart_window()
+            if available < current:
+                self._permitter.drain(current - available)
+            elif available > current and used == 1:
+                self._permitter.release(available - current)
+
+
+class SlidingWindowRateLimiter(_BlockingRateLimiter):
+    """Allows at most `window_permits` requests in any `window_seconds` long interval.
+
+    Each permit is logged when its request finishes and expires one window later, so there is no burst at the
+    edge of a window and no dependence on the phase of the server's window.
+    """
+
+    def __init__(self, window_seconds: int, window_permits: float, timeout: float = -1):
+        super().__init__(window_seconds, window_permits, timeout)
+        self._log = deque()  # Monotonic times at which requests finished
+        self._in_flight = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self._window_seconds
+        while self._log and self._log[0] <= cutoff:
+            self._log.popleft()
+
+    def _wait_time(self, now: float) -> float:
+        if now < self._restricted_until:
+            return self._restricted_until - now
+        self._prune(now)
+        used = len(self._log) + self._in_flight
+        if used < self._window_permits:
+            return 0
+        # The log entry that has to expire before a permit becomes available
+        index = floor(used - self._window_permits)
+        if index < len(self._log):
+            return self._log[index] + self._window_seconds - now
+        return None
+
+    def _take_permit(self, now: float) -> None:
+        self._in_flight += 1
+
+    def _used(self, now: float) -> int:
+        self._prune(now)
+        return len(self._log) + self._in_flight
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._log.append(monotonic())
+            self._condition.notify_all()
+
+    def reconcile(self, used: int) -> None:
+        with self._condition:
+            now = monotonic()
+            self._prune(now)
+            missing = used - len(self._log) - self._in_flight
+            # Permits used by someone else are assumed to have been used just now, which is the safe assumption.
+            for _ in range(missing):
+                self._log.append(now)
+
+
+class GCRARateLimiter(_BlockingRateLimiter):
+    """Generic cell rate algorithm: spaces requests evenly across the window.
+
+    Up to `burst` requests may be sent back to back after the limiter has been idle. To stay within
+    `window_permits` per window the steady-state spacing is `window_seconds / (window_permits - burst + 1)`.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int,
+        window_permits: float,
+        timeout: float = -1,
+        burst_fraction: float = 0.0,
+    ):
+        super().__init__(window_seconds, window_permits, timeout)
+        self._burst_fraction = burst_fraction
+        self._theoretical_arrival = 0.0
+        self._log = deque()  # Monotonic times at which permits were counted in the last window
+
+    @property
+    def _burst(self) -> int:
+        return max(1, floor(self._window_permits * self._burst_fraction))
+
+    @property
+    def _interval(self) -> float:
+        return self._window_seconds / max(1.0, self._window_permits - self._burst + 1)
+
+    def _wait_time(self, now: float) -> float:
+        if now < self._restricted_until:
+            return self._restricted_until - now
+        tolerance = (self._burst - 1) * self._interval
+        theoretical_arrival = max(self._theoretical_arrival, now)
+        return max(0.0, theoretical_arrival - tolerance - now)
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self._window_seconds
+        while self._log and self._log[0] <= cutoff:
+            self._log.popleft()
+
+    def _take_permit(self, now: float) -> None:
+        self._theoretical_arrival = max(self._theoretical_arrival, now) + self._interval
+        self._log.append(now)
+
+    def _used(self, now: float) -> int:
+        return ceil(max(0.0, self._theoretical_arrival - now) / self._interval)
+
+    def reconcile(self, used: int) -> None:
+        with self._condition:
+            now = monotonic()
+            self._prune(now)
+            # The server's count includes the permits issued here, which are already in the theoretical arrival time
+            missing = used - len(self._log)
+            if missing > 0:
+                self._theoretical_arrival = (
+                    max(self._theoretical_arrival, now) + missing * self._interval
+                )
+                for _ in range(missing):
+                    self._log.append(now)
+
+
+class SharedSlidingWindowRateLimiter(RateLimiter):
+    """A sliding-window limiter whose log lives in a file, so every process on the host shares one bucket.
+
+    The log is a ring buffer of finish times (wall clock) guarded by an exclusive `flock`, so no coordinator process
+    has to stay alive. Requires a POSIX system.
+    """
+
+    requires_name = True
+
+    _HEADER = struct.Struct("<dqqq")  # restricted until, head, count, capacity
+    _ENTRY = struct.Struct("<d")
+
+    def __init__(
+        self,
+        window_seconds: int,
+        window_permits: float,
+        name: str,
+        directory: str = None,
+        namespace: str = "",
+        timeout: float = -1,
+    ):
+        if fcntl is None:
+            raise RuntimeError(
+                "The shared_sliding_window rate limiter requires a POSIX system."
+            )
+        self._window_seconds = window_seconds
+        self._window_permits = window_permits
+        self._timeout = timeout
+
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(), "cassiopeia-ratelimits")
+        directory = os.path.join(directory, namespace)
+        os.makedirs(directory, exist_ok=True)
+        filename = re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".bin"
+        self._fd = os.open(
+            os.path.join(directory, filename), os.O_RDWR | os.O_CREAT, 0o600
+        )
+
+        # flock is per open file, so threads in this process also need to take a regular lock
+        self._lock = Lock()
+        self._total_permits_issued = 0
+        self._local = local()
+
+        with self._locked():
+            if os.fstat(self._fd).st_size < self._HEADER.size:
+                self._write_header(0.0, 0, 0, 0)
+            self._grow(ceil(window_permits))
+
+    def __del__(self):
+        try:
+            os.close(self._fd)
+        except (AttributeError, OSError):
+            pass
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read_header(self):
+        return self._HEADER.unpack(os.pread(self._fd, self._HEADER.size, 0))
+
+    def _write_header(self, restricted_until, head, count, capacity) -> None:
+        header = self._HEADER.pack(restricted_until, head, count, capacity)
+        os.pwrite(self._fd, header, 0)
+
+    def _offset(self, slot: int) -> int:
+        return self._HEADER.size + slot * self._ENTRY.size
+
+    def _read_entry(self, slot: int) -> float:
+        entry = os.pread(self._fd, self._ENTRY.size, self._offset(slot))
+        return self._ENTRY.unpack(entry)[0]
+
+    def _write_entry(self, slot: int, value: float) -> None:
+        os.pwrite(self._fd, self._ENTRY.pack(value), self._offset(slot))
+
+    def _grow(self, capacity: int) -> None:
+        # Must be called while locked. Rewrites the ring buffer starting at slot 0 with the larger capacity.
+        restricted_until, head, count, old_capacity = self._read_header()
+        if capacity <= old_capacity:
+            return
+        entries = [self._read_entry((head + i) % old_capacity) for i in range(count)]
+        os.ftruncate(self._fd, self._offset(capacity))
+        for slot, entry in enumerate(entries):
+            self._write_entry(slot, entry)
+        self._write_header(restricted_until, 0, count, capacity)
+
+    def _prune(self, now: float):
+        # Must be called while locked. Returns the pruned header.
+        restricted_until, head, count, capacity = self._read_header()
+        cutoff = now - self._window_seconds
+        while count > 0 and self._read_entry(head) <= cutoff:
+            head = (head + 1) % capacity
+            count -= 1
+        return restricted_until, head, count, capacity
+
+    def __enter__(self) -> "SharedSlidingWindowRateLimiter":
+        deadline = None if self._timeout < 0 else monotonic() + self._timeout
+        while True:
+            with self._locked():
+                self._grow(ceil(self._window_permits))
+                now = time.time()
+                restricted_until, head, count, capacity = self._prune(now)
+                if now < restricted_until:
+                    wait = restricted_until - now
+                elif count < self._window_permits:
+                    slot = (head + count) % capacity
+                    self._write_entry(slot, now)
+                    self._write_header(restricted_until, head, count + 1, capacity)
+                    self._local.entry = (slot, now)
+                    self._total_permits_issued += 1
+                    return self
+                else:
+                    index = floor(count - self._window_permits)
+                    expires = self._read_entry((head + index) % capacity)
+                    wait = expires + self._window_seconds - now
+                    self._write_header(restricted_until, head, count, capacity)
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Rate Limiter timed out!")
+                wait = min(wait, remaining)
+            sleep(max(wait, 0.0))
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # Re-stamp the entry with the time the request finished, unless another process already reused the slot.
+        slot, entered = self._local.entry
+        with self._locked():
+            if self._read_entry(slot) == entered:
+                self._write_entry(slot, time.time())
+
+    def set_permits(self, permits: float) -> None:
+        self._window_permits = permits
+
+    def restrict_for(self, seconds: float) -> None:
+        with self._locked():
+            _, head, count, capacity = self._read_header()
+            self._write_header(time.time() + seconds, head, count, capacity)
+
+    def reconcile(self, used: int) -> None:
+        with self._locked():
+            now = time.time()
+            restricted_until, head, count, capacity = self._prune(now)
+            # The log already has every co-operating process's requests, so only the permits none of them recorded
+            # are added. `used` is already scaled down to the limiting share by RiotAPIRateLimiter.reconcile_counts.
+            missing = min(used, capacity) - count
+            for _ in range(missing):
+                self._write_entry((head + count) % capacity, now)
+                count += 1
+            self._write_header(restricted_until, head, count, capacity)
+
+    def usage(self) -> Tuple[int, float]:
+        # The permits used in the last window, and the seconds left on the current restriction
+        with self._locked():
+            now = time.time()
+            restricted_until, _, count, _ = self._prune(now)
+            return count, max(0.0, restricted_until - now)
+
+    @property
+    def permits_issued(self) -> int:
+        with self._lock:
+            return self._total_permits_issued
+
+    def reset_permits_issued(self) -> None:
+        with self._lock:
+            self._total_permits_issued = 0
@@ -0,0 +1,731 @@
+from typing import (
+    Type,
+    TypeVar,
+    MutableMapping,
+    Any,
+    Iterable,
+    List,
+    Tuple,
+    Callable,
+)
+from threading import local, Lock
+import datetime
+import itertools
+import json
+import sqlite3
+import time
+
+from datapipelines import (
+    DataSource,
+    DataSink,
+    PipelineContext,
+    Query,
+    NotFoundError,
+    validate_query,
+)
+
+from ..data import Platform, Region, Queue, Tier, Division
+from ..dto.match import MatchDto, TimelineDto
+from ..dto.summoner import SummonerDto
+from ..dto.league import LeagueEntriesDto
+from ..dto.staticdata.champion import ChampionListDto
+from ..dto.staticdata.rune import RuneListDto
+from ..dto.staticdata.item import ItemListDto
+from ..dto.staticdata.summonerspell import SummonerSpellListDto
+from ..dto.staticdata.map import MapListDto
+from ..dto.staticdata.profileicon import ProfileIconDataDto
+from ..dto.staticdata.language import LanguagesDto, LanguageStringsDto
+from ..dto.staticdata.realm import RealmDto
+from ..dto.staticdata.version import VersionListDto
+from .uniquekeys import convert_region_to_platform
+
+T = TypeVar("T")
+
+
+default_expirations = {
+    MatchDto: -1,
+    TimelineDto: -1,
+    SummonerDto: datetime.timedelta(days=1),
+    LeagueEntriesDto: datetime.timedelta(hours=6),
+    ChampionListDto: -1,
+    RuneListDto: -1,
+    ItemListDto: -1,
+    SummonerSpellListDto: -1,
+    MapListDto: -1,
+    ProfileIconDataDto: -1,
+    LanguageStringsDto: -1,
+    LanguagesDto: datetime.timedelta(days=20),
+    RealmDto: datetime.timedelta(hours=6),
+    VersionListDto: datetime.timedelta(hours=6),
+}
+
+# Static data for a version never changes, so it's stored per version and locale
+_VERSIONED_STATIC_TYPES = (
+    ChampionListDto,
+    RuneListDto,
+    ItemListDto,
+    SummonerSpellListDto,
+    MapListDto,
+    ProfileIconDataDto,
+    LanguageStringsDto,
+)
+_UNVERSIONED_STATIC_TYPES = (LanguagesDto, RealmDto, VersionListDto)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    platform TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    queue INTEGER,
+    creation INTEGER,
+    expires REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (platform, id)
+);
+CREATE INDEX IF NOT EXISTS matches_by_queue ON matches (queue, creation);
+CREATE INDEX IF NOT EXISTS matches_by_creation ON matches (creation);
+CREATE TABLE IF NOT EXISTS match_participants (
+    puuid TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    match_id INTEGER NOT NULL,
+    PRIMARY KEY (puuid, platform, match_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS timelines (
+    platform TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    expires REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (platform, id)
+);
+CREATE TABLE IF NOT EXISTS summoners (
+    platform TEXT NOT NULL,
+    puuid TEXT NOT NULL,
+    id TEXT,
+    account_id TEXT,
+    name TEXT COLLATE NOCASE,
+    expires REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (platform, puuid)
+);
+CREATE INDEX IF NOT EXISTS summoners_by_id ON summoners (platform, id);
+CREATE INDEX IF NOT EXISTS summoners_by_account_id ON summoners (platform, account_id);
+CREATE INDEX IF NOT EXISTS summoners_by_name ON summoners (platform, name);
+CREATE TABLE IF NOT EXISTS league_entries (
+    region TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    division TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    expires REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (region, queue, tier, division, page)
+);
+CREATE TABLE IF NOT EXISTS static_data (
+    type TEXT NOT NULL,
+    region TEXT NOT NULL,
+    version TEXT NOT NULL,
+    locale TEXT NOT NULL,
+    expires REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (type, region, version, locale)
+);
+"""
+
+# The tables that can be cleared and expired for each type
+_TABLES = {
+    MatchDto: ["matches"],
+    TimelineDto: ["timelines"],
+    SummonerDto: ["summoners"],
+    LeagueEntriesDto: ["league_entries"],
+}
+
+
+def _encode(item: Any) -> str:
+    # Sets (e.g. "includedData") aren't JSON serializable
+    return json.dumps(item, separators=(",", ":"), default=list)
+
+
+def _decode(type: Type[T], data: str) -> T:
+    item = type(json.loads(data))
+    if "includedData" in item:
+        item["includedData"] = set(item["includedData"])
+    return item
+
+
+class SQLiteStore(DataSource, DataSink):
+    """A data store that keeps matches, timelines, summoners, league entries, and static data in an SQLite database.
+
+    The database is opened in WAL mode so that reads aren't blocked by writes, and each `put_many` is written in
+    transactions of up to `batch_size` items.
+    """
+
+    def __init__(
+        self,
+        path: str = "cassiopeia.sqlite",
+        expirations: MutableMapping[type, float] = None,
+        batch_size: int = 500,
+        timeout: float = 30.0,
+    ) -> None:
+        self._path = path
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._expirations = dict(default_expirations)
+        for key, value in (expirations or {}).items():
+            if isinstance(key, str):
+                key = globals()[key]
+            self._expirations[key] = value
+        for key, value in list(self._expirations.items()):
+            if isinstance(value, datetime.timedelta):
+                self._expirations[key] = value.total_seconds()
+
+        # sqlite3 connections can't be shared between threads, so each thread gets its own
+        self._local = local()
+        self._connections = []
+        self._connections_lock = Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        try:
+            return self._local.connection
+        except AttributeError:
+            pass
+        connection = sqlite3.connect(
+            self._path, timeout=self._timeout, check_same_thread=False
+        )
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self._local.connection = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = local()
+
+    @DataSource.dispatch
+    def get(
+        self,
+        type: Type[T],
+        query: MutableMapping[str, Any],
+        context: PipelineContext = None,
+    ) -> T:
+        pass
+
+    @DataSource.dispatch
+    def get_many(
+        self,
+        type: Type[T],
+        query: MutableMapping[str, Any],
+        context: PipelineContext = None,
+    ) -> Iterable[T]:
+        pass
+
+    @DataSink.dispatch
+    def put(self, type: Type[T], item: T, context: PipelineContext = None) -> None:
+        pass
+
+    @DataSink.dispatch
+    def put_many(
+        self, type: Type[T], items: Iterable[T], context: PipelineContext = None
+    ) -> None:
+        pass
+
+    def _select(self, type: Type[T], sql: str, parameters: Tuple) -> T:
+        row = (
+            self._connection()
+            .execute(
+                sql + " AND (expires IS NULL OR expires > ?)",
+                parameters + (time.time(),),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise NotFoundError
+        return _decode(type, row[0])
+
+    def _write(
+        self,
+        items: Iterable[T],
+        write: Callable[[sqlite3.Connection, T, float], None],
+    ) -> None:
+        connection = self._connection()
+        items = iter(items)
+        while True:
+            batch = list(itertools.islice(items, self._batch_size))
+            if not batch:
+                return
+            with connection:  # One transaction per batch
+                for item in batch:
+                    expire_seconds = self._expirations.get(item.__class__, -1)
+                    if expire_seconds == 0:
+                        continue
+                    expires = None
+                    if expire_seconds != -1:
+                        expires = time.time() + expire_seconds
+                    write(connection, item, expires)
+
+    def clear(self, type: Type[T] = None) -> None:
+        self._delete(type, "")
+
+    def expire(self, type: Type[T] = None) -> None:
+        self._delete(type, " WHERE expires IS NOT NULL AND expires <= ?", time.time())
+
+    def _delete(self, type: Type[T], where: str, *parameters: Any) -> None:
+        statements = []
+        if type is None:
+            tables = [table for tables in _TABLES.values() for table in tables]
+            statements = [
+                ("DELETE FROM {}{}".format(table, where), parameters)
+                for table in tables + ["static_data"]
+            ]
+        elif type in _TABLES:
+            statements = [
+                ("DELETE FROM {}{}".format(table, where), parameters)
+                for table in _TABLES[type]
+            ]
+        elif type in _VERSIONED_STATIC_TYPES or type in _UNVERSIONED_STATIC_TYPES:
+            where = where.replace("WHERE", "AND") if where else ""
+            statements = [
+                (
+                    "DELETE FROM static_data WHERE type = ?" + where,
+                    (type.__name__,) + parameters,
+                )
+            ]
+        connection = self._connection()
+        with connection:
+            for sql, statement_parameters in statements:
+                connection.execute(sql, statement_parameters)
+            if type is None or type is MatchDto:
+                connection.execute(
+                    "DELETE FROM match_participants WHERE NOT EXISTS "
+                    "(SELECT 1 FROM matches WHERE matches.platform = "
+                    "match_participants.platform AND matches.id = match_participants.match_id)"
+                )
+
+    def match_ids(
+        self,
+        puuid: str,
+        queue: Queue = None,
+        start_time: int = None,
+        end_time: int = None,
+    ) -> List[Tuple[Platform, int]]:
+        """Returns the (platform, id) of every stored match that `puuid` played in, most recent first.
+
+        `start_time` and `end_time` are game creation times in milliseconds.
+        """
+        sql = (
+            "SELECT matches.platform, matches.id FROM match_participants "
+            "JOIN matches ON matches.platform = match_participants.platform "
+            "AND matches.id = match_participants.match_id "
+            "WHERE match_participants.puuid = ?"
+        )
+        parameters = [puuid]
+        if queue is not None:
+            sql += " AND matches.queue = ?"
+            parameters.append(queue.id if isinstance(queue, Queue) else queue)
+        if start_time is not None:
+            sql += " AND matches.creation >= ?"
+            parameters.append(start_time)
+        if end_time is not None:
+            sql += " AND matches.creation < ?"
+            parameters.append(end_time)
+        sql += " ORDER BY matches.creation DESC"
+        rows = self._connection().execute(sql, parameters).fetchall()
+        return [(Platform(platform), id) for platform, id in rows]
+
+    ###########
+    # Matches #
+    ###########
+
+    _validate_get_match_query = (
+        Query.has("platform").as_(Platform).also.has("id").as_(int)
+    )
+
+    @get.register(MatchDto)
+    @validate_query(_validate_get_match_query, convert_region_to_platform)
+    def get_match(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> MatchDto:
+        return self._select(
+            MatchDto,
+            "SELECT data FROM matches WHERE platform = ? AND id = ?",
+            (query["platform"].value, query["id"]),
+        )
+
+    _validate_get_many_match_query = (
+        Query.has("platform").as_(Platform).also.has("ids").as_(Iterable)
+    )
+
+    @get_many.register(MatchDto)
+    @validate_query(_validate_get_many_match_query, convert_region_to_platform)
+    def get_many_match(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> Iterable[MatchDto]:
+        # Every match has to be found before any is returned, so a partial result isn't mistaken for a full one
+        matches = [
+            self.get_match({"platform": query["platform"], "id": id}, context)
+            for id in query["ids"]
+        ]
+        return (match for match in matches)
+
+    @staticmethod
+    def _write_match(
+        connection: sqlite3.Connection, item: MatchDto, expires: float
+    ) -> None:
+        platform = item["platformId"]
+        id = item["matchId"]
+        connection.execute(
+            "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                platform,
+                id,
+                item.get("queueId"),
+                item.get("gameCreation"),
+                expires,
+                _encode(item),
+            ),
+        )
+        connection.executemany(
+            "INSERT OR IGNORE INTO match_participants VALUES (?, ?, ?)",
+            [
+                (participant["puuid"], platform, id)
+                for participant in item.get("participants", [])
+                if participant.get("puuid")
+            ],
+        )
+
+    @put.register(MatchDto)
+    def put_match(self, item: MatchDto, context: PipelineContext = None) -> None:
+        self._write([item], self._write_match)
+
+    @put_many.register(MatchDto)
+    def put_many_match(
+        self, items: Iterable[MatchDto], context: PipelineContext = None
+    ) -> None:
+        self._write(items, self._write_match)
+
+    #############
+    # Timelines #
+    #############
+
+    @get.register(TimelineDto)
+    @validate_query(_validate_get_match_query, convert_region_to_platform)
+    def get_timeline(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> TimelineDto:
+        return self._select(
+            TimelineDto,
+            "SELECT data FROM timelines WHERE platform = ? AND id = ?",
+            (query["platform"].value, query["id"]),
+        )
+
+    @staticmethod
+    def _write_timeline(
+        connection: sqlite3.Connection, item: TimelineDto, expires: float
+    ) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO timelines VALUES (?, ?, ?, ?)",
+            (item["platform"], item["matchId"], expires, _encode(item)),
+        )
+
+    @put.register(TimelineDto)
+    def put_timeline(self, item: TimelineDto, context: PipelineContext = None) -> None:
+        self._write([item], self._write_timeline)
+
+    @put_many.register(TimelineDto)
+    def put_many_timeline(
+        self, items: Iterable[TimelineDto], context: PipelineContext = None
+    ) -> None:
+        self._write(items, self._write_timeline)
+
+    #############
+    # Summoners #
+    #############
+
+    _validate_get_summoner_query = (
+        Query.has("id")
+        .as_(str)
+        .or_("accountId")
+        .as_(str)
+        .or_("puuid")
+        .as_(str)
+        .or_("name")
+        .as_(str)
+        .also.has("platform")
+        .as_(Platform)
+    )
+
+    @get.register(SummonerDto)
+    @validate_query(_validate_get_summoner_query, convert_region_to_platform)
+    def get_summoner(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> SummonerDto:
+        for key, column in (
+            ("puuid", "puuid"),
+            ("id", "id"),
+            ("accountId", "account_id"),
+            ("name", "name"),
+        ):
+            if key in query:
+                return self._select(
+                    SummonerDto,
+                    "SELECT data FROM summoners WHERE platform = ? AND {} = ?".format(
+                        column
+                    ),
+                    (query["platform"].value, query[key]),
+                )
+
+    @staticmethod
+    def _write_summoner(
+        connection: sqlite3.Connection, item: SummonerDto, expires: float
+    ) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO summoners VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                Region(item["region"]).platform.value,
+                item["puuid"],
+                item.get("id"),
+                item.get("accountId"),
+                item.get("name"),
+                expires,
+                _encode(item),
+            ),
+        )
+
+    @put.register(SummonerDto)
+    def put_summoner(self, item: SummonerDto, context: PipelineContext = None) -> None:
+        self._write([item], self._write_summoner)
+
+    @put_many.register(SummonerDto)
+    def put_many_summoner(
+        self, items: Iterable[SummonerDto], context: PipelineContext = None
+    ) -> None:
+        self._write(items, self._write_summoner)
+
+    ##################
+    # League Entries #
+    ##################
+
+    _validate_get_league_entries_query = (
+        Query.has("queue")
+        .as_(Queue)
+        .also.has("tier")
+        .as_(Tier)
+        .also.has("division")
+        .as_(Division)
+        .also.has("page")
+        .as_(int)
+        .also.has("platform")
+        .as_(Platform)
+    )
+
+    @get.register(LeagueEntriesDto)
+    @validate_query(_validate_get_league_entries_query, convert_region_to_platform)
+    def get_league_entries(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> LeagueEntriesDto:
+        return self._select(
+            LeagueEntriesDto,
+            "SELECT data FROM league_entries WHERE region = ? AND queue = ? AND tier = ? AND division = ? AND page = ?",
+            (
+                query["platform"].region.value,
+                query["queue"].value,
+                query["tier"].value,
+                query["division"].value,
+                query["page"],
+            ),
+        )
+
+    @staticmethod
+    def _write_league_entries(
+        connection: sqlite3.Connection, item: LeagueEntriesDto, expires: float
+    ) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO league_entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                item["region"],
+                item["queue"],
+                item["tier"],
+                item["division"],
+                item["page"],
+                expires,
+                _encode(item),
+            ),
+        )
+
+    @put.register(LeagueEntriesDto)
+    def put_league_entries(
+        self, item: LeagueEntriesDto, context: PipelineContext = None
+    ) -> None:
+        self._write([item], self._write_league_entries)
+
+    @put_many.register(LeagueEntriesDto)
+    def put_many_league_entries(
+        self, items: Iterable[LeagueEntriesDto], context: PipelineContext = None
+    ) -> None:
+        self._write(items, self._write_league_entries)
+
+    ###############
+    # Static Data #
+    ###############
+
+    _validate_get_versioned_static_data_query = (
+        Query.has("platform")
+        .as_(Platform)
+        .also.has("version")
+        .as_(str)
+        .also.can_have("locale")
+        .as_(str)
+    )
+
+    _validate_get_static_data_query = Query.has("platform").as_(Platform)
+
+    def _get_static_data(
+        self, type: Type[T], query: MutableMapping[str, Any], versioned: bool = True
+    ) -> T:
+        if versioned:
+            version = query["version"]
+            locale = query.get("locale") or query["platform"].default_locale
+        else:
+            version, locale = "", ""
+        return self._select(
+            type,
+            "SELECT data FROM static_data WHERE type = ? AND region = ? AND version = ? AND locale = ?",
+            (type.__name__, query["platform"].region.value, version, locale),
+        )
+
+    @get.register(ChampionListDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_champion_list(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> ChampionListDto:
+        return self._get_static_data(ChampionListDto, query)
+
+    @get.register(RuneListDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_rune_list(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> RuneListDto:
+        return self._get_static_data(RuneListDto, query)
+
+    @get.register(ItemListDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_item_list(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> ItemListDto:
+        return self._get_static_data(ItemListDto, query)
+
+    @get.register(SummonerSpellListDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_summoner_spell_list(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> SummonerSpellListDto:
+        return self._get_static_data(SummonerSpellListDto, query)
+
+    @get.register(MapListDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_map_list(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> MapListDto:
+        return self._get_static_data(MapListDto, query)
+
+    @get.register(ProfileIconDataDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_profile_icons(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> ProfileIconDataDto:
+        return self._get_static_data(ProfileIconDataDto, query)
+
+    @get.register(LanguageStringsDto)
+    @validate_query(
+        _validate_get_versioned_static_data_query, convert_region_to_platform
+    )
+    def get_language_strings(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> LanguageStringsDto:
+        return self._get_static_data(LanguageStringsDto, query)
+
+    @get.register(LanguagesDto)
+    @validate_query(_validate_get_static_data_query, convert_region_to_platform)
+    def get_languages(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> LanguagesDto:
+        return self._get_static_data(LanguagesDto, query, versioned=False)
+
+    @get.register(RealmDto)
+    @validate_query(_validate_get_static_data_query, convert_region_to_platform)
+    def get_realms(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> RealmDto:
+        return self._get_static_data(RealmDto, query, versioned=False)
+
+    @get.register(VersionListDto)
+    @validate_query(_validate_get_static_data_query, convert_region_to_platform)
+    def get_versions(
+        self, query: MutableMapping[str, Any], context: PipelineContext = None
+    ) -> VersionListDto:
+        return self._get_static_data(VersionListDto, query, versioned=False)
+
+    @staticmethod
+    def _write_static_data(
+        connection: sqlite3.Connection, item: Any, expires: float
+    ) -> None:
+        if isinstance(item, _VERSIONED_STATIC_TYPES):
+            version, locale = item["version"], item["locale"]
+        else:
+            version, locale = "", ""
+        connection.execute(
+            "INSERT OR REPLACE INTO static_data VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                item.__class__.__name__,
+                item["region"],
+                version,
+                locale,
+                expires,
+                _encode(item),
+            ),
+        )
+
+    @put.register(ChampionListDto)
+    @put.register(RuneListDto)
+    @put.register(ItemListDto)
+    @put.register(SummonerSpellListDto)
+    @put.register(MapListDto)
+    @put.register(ProfileIconDataDto)
+    @put.register(LanguageStringsDto)
+    @put.register(LanguagesDto)
+    @put.register(RealmDto)
+    @put.register(VersionListDto)
+    def put_static_data(self, item: Any, context: PipelineContext = None) -> None:
+        self._write([item], self._write_static_data)
+
+    @put_many.register(ChampionListDto)
+    @put_many.register(RuneListDto)
+    @put_many.register(ItemListDto)
+    @put_many.register(SummonerSpellListDto)
+    @put_many.register(MapListDto)
+    @put_many.register(ProfileIconDataDto)
+    @put_many.register(LanguageStringsDto)
+    @put_many.register(LanguagesDto)
+    @put_many.register(RealmDto)
+    @put_many.register(VersionListDto)
+    def put_many_static_data(
+        self, items: Iterable[Any], context: PipelineContext = None
+    ) -> None:
+        self._write(items, self._write_static_data)
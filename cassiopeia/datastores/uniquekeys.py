@@ -3244,29 +3244,18 @@ def for_summoner_query(query: Query) -> List[Tuple]:
 
 
 def for_many_summoner_query(query: Query) -> Generator[List[Tuple], None, None]:
-    grouped_identifiers = []
-    identifier_types = []
-    if "ids" in query:
-        grouped_identifiers.append(query["ids"])
-        identifier_types.append(str)
-    elif "accountIds" in query:
-        grouped_identifiers.append(query["accountIds"])
-        identifier_types.append(str)
-    elif "puuids" in query:
-        grouped_identifiers.append(query["puuids"])
-        identifier_types.append(str)
-    elif "names" in query:
-        grouped_identifiers.append(query["names"])
-        identifier_types.append(str)
-    for identifiers in zip(*grouped_identifiers):
-        keys = []
-        for identifier, identifier_type in zip(identifiers, identifier_types):
-            try:
-                identifier = identifier_type(identifier)
-                keys.append((query["platform"].value, identifier))
-            except ValueError as e:
-                raise QueryValidationError from e
-        yield keys
+    for plural, singular in (
+        ("ids", "id"),
+        ("accountIds", "accountId"),
+        ("puuids", "puuid"),
+        ("names", "name"),
+    ):
+        if plural in query:
+            break
+    else:
+        return
+    for identifier in query[plural]:
+        yield [(query["platform"].value, singular, str(identifier))]
 
 
 ################
@@ -0,0 +1,159 @@
+"""Tracing of where the time of a request is spent.
+
+While an exporter is set, every pipeline request, ghost load, data source tried, transformer applied, data sink put,
+HTTP call, rate limit wait, and retry wait is timed as a `Span`. Spans started while another span is open become its
+children, and each finished top-level span is passed to the exporter with all of its children. Without an exporter,
+spans aren't created at all.
+
+    from cassiopeia import tracing
+
+    tracing.set_exporter(tracing.LoggingExporter(min_duration=0.5))
+"""
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+LOGGER = logging.getLogger("cassiopeia.tracing")
+
+
+class Span(object):
+    __slots__ = ["name", "attributes", "start", "end", "children"]
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.start = perf_counter()
+        self.end = None
+        self.children = []  # type: List[Span]
+
+    @property
+    def duration(self) -> float:
+        """The number of seconds the span took, or has taken so far if it hasn't ended."""
+        end = self.end if self.end is not None else perf_counter()
+        return end - self.start
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def walk(self, depth: int = 0):
+        """Yields `(depth, span)` for this span and its descendants, depth first."""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def __str__(self) -> str:
+        attributes = " ".join(
+            "{}={}".format(key, value) for key, value in self.attributes.items()
+        )
+        return "{name} {duration:.2f} ms{space}{attributes}".format(
+            name=self.name,
+            duration=self.duration * 1000,
+            space=" " if attributes else "",
+            attributes=attributes,
+        )
+
+
+def format_span(span: Span) -> str:
+    """Returns the span and its descendants as an indented tree, one span per line."""
+    return "\n".join("  " * depth + str(child) for depth, child in span.walk())
+
+
+class _NoSpan(object):
+    # Returned by `span` while tracing is off
+    __slots__ = []
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+_exporter = None  # type: Optional[Callable[[Span], None]]
+_current = ContextVar("cassiopeia_current_span", default=None)
+
+
+class _ActiveSpan(object):
+    __slots__ = ["span", "parent", "token"]
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.span = Span(name, attributes)
+
+    def __enter__(self) -> Span:
+        self.parent = _current.get()
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        span = self.span
+        span.end = perf_counter()
+        _current.reset(self.token)
+        if exc_type is not None:
+            span.attributes["error"] = exc_type.__name__
+        if self.parent is not None:
+            self.parent.children.append(span)
+        else:
+            exporter = _exporter
+            if exporter is not None:
+                try:
+                    exporter(span)
+                except Exception:
+                    LOGGER.exception("The span exporter failed")
+        return False
+
+
+def span(name: str, **attributes: Any):
+    """Use as a context manager; times the code inside it as a span named `name` if tracing is on."""
+    if _exporter is None:
+        return _NO_SPAN
+    return _ActiveSpan(name, attributes)
+
+
+def set_exporter(exporter: Optional[Callable[[Span], None]]) -> None:
+    """Turns tracing on, with `exporter` called with each finished top-level span, or off if `exporter` is None."""
+    global _exporter
+    _exporter = exporter
+
+
+def get_exporter() -> Optional[Callable[[Span], None]]:
+    return _exporter
+
+
+class SpanCollector(object):
+    """An exporter that keeps the most recent `max_spans` top-level spans in `spans`."""
+
+    def __init__(self, max_spans: int = 1000):
+        self.max_spans = max_spans
+        self.spans = []  # type: List[Span]
+
+    def __call__(self, span: Span) -> None:
+        self.spans.append(span)
+        if len(self.spans) > self.max_spans:
+            del self.spans[: len(self.spans) - self.max_spans]
+
+    def clear(self) -> None:
+        self.spans = []
+
+
+class LoggingExporter(object):
+    """An exporter that logs the top-level spans that took at least `min_duration` seconds, as indented trees."""
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,
+        min_duration: float = 0.0,
+        level: int = logging.INFO,
+    ):
+        self.logger = logger if logger is not None else LOGGER
+        self.min_duration = min_duration
+        self.level = level
+
+    def __call__(self, span: Span) -> None:
+        if span.duration >= self.min_duration:
+            self.logger.log(self.level, "%s", format_span(span))
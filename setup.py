@@ -6,7 +6,7 @@ from setuptools import setup, find_packages
 
 
 install_requires = [
-    "datapipelines>=1.0.7",
+    "datapipelines>=1.0.7,<1.1",
     "merakicommons>=1.0.10",
     "Pillow",
     "arrow",
@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture
+def use_pipeline(monkeypatch):
+    """Makes ghost objects and the top-level functions load their data from the given pipeline."""
+    from cassiopeia import configuration
+
+    def use(pipeline):
+        monkeypatch.setattr(configuration.settings, "_Settings__pipeline", pipeline)
+        return pipeline
+
+    return use
@@ -0,0 +1,60 @@
+"""Data sources for tests that run a data pipeline without the Riot API."""
+import threading
+import time
+
+from datapipelines import DataSource, NotFoundError
+
+from cassiopeia.core.summoner import SummonerData
+from cassiopeia.core.staticdata.realm import Realms, RealmData
+
+
+class StubSource(DataSource):
+    """Answers `get` and `get_many` requests for the types in `get` and `get_many` with the function for the type,
+    which is called with the query, after waiting `delay` seconds. Records each query and the thread it came from.
+    """
+
+    def __init__(self, get=None, get_many=None, delay: float = 0.0):
+        self._get = dict(get or {})
+        self._get_many = dict(get_many or {})
+        self.delay = delay
+        self.queries = []
+        self.threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def provides(self):
+        return set(self._get) | set(self._get_many)
+
+    @property
+    def requests(self) -> int:
+        return len(self.queries)
+
+    def _call(self, functions, type, query):
+        try:
+            function = functions[type]
+        except KeyError:
+            raise DataSource.unsupported(type)
+        with self._lock:
+            self.queries.append(query)
+            self.threads.append(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+        return function(query)
+
+    def get(self, type, query, context=None):
+        return self._call(self._get, type, query)
+
+    def get_many(self, type, query, context=None):
+        return self._call(self._get_many, type, query)
+
+
+def not_found(query):
+    raise NotFoundError
+
+
+def realms(version: str = "13.1.1") -> Realms:
+    return Realms.from_data(RealmData(region="NA", version=version))
+
+
+def summoner_data(query) -> SummonerData:
+    return SummonerData(puuid=query["puuid"], region="NA", summonerLevel=30)
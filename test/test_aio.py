@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+
+import pytest
+from datapipelines import DataPipeline
+
+from cassiopeia import aio, request_priority
+from cassiopeia.core import Summoner
+from cassiopeia.core.summoner import SummonerData
+from cassiopeia.core.staticdata.realm import Realms
+from cassiopeia.datastores.riotapi.ratelimits import get_request_priority
+
+from .stubs import StubSource, realms, summoner_data
+
+_variable = ContextVar("test_aio_variable", default=None)
+
+
+@pytest.fixture
+def source(use_pipeline):
+    source = StubSource(
+        get={Realms: lambda query: realms(), SummonerData: summoner_data}
+    )
+    use_pipeline(DataPipeline([source]))
+    return source
+
+
+@pytest.fixture
+def max_workers():
+    yield aio.set_max_workers
+    aio.set_max_workers(64)
+
+
+def test_endpoints_run_on_the_thread_pool(source):
+    result = asyncio.run(aio.get_realms(region="NA"))
+    assert result.version == "13.1.1"
+    assert source.threads[0].startswith("cassiopeia-aio")
+    assert aio.get_realms.__name__ == "get_realms"
+
+
+def test_aload(source):
+    summoner = Summoner._construct_normally(puuid="aload", region="NA")
+    assert asyncio.run(summoner.aload()) is summoner
+    assert summoner.level == 30
+    assert len(source.threads) == 1
+    assert source.threads[0].startswith("cassiopeia-aio")
+
+
+def test_context_variables_are_copied_into_the_thread_pool():
+    async def main():
+        _variable.set("value")
+        with request_priority(5):
+            return await aio.run(lambda: (_variable.get(), get_request_priority()))
+
+    assert asyncio.run(main()) == ("value", 5)
+
+
+def test_set_max_workers(max_workers):
+    async def sleep_concurrently(calls):
+        start = time.monotonic()
+        await asyncio.gather(*[aio.run(time.sleep, 0.1) for _ in range(calls)])
+        return time.monotonic() - start
+
+    max_workers(1)
+    assert asyncio.run(sleep_concurrently(3)) >= 0.3
+    max_workers(3)
+    assert asyncio.run(sleep_concurrently(3)) < 0.25
+
+
+def test_iterate_runs_on_the_thread_pool():
+    threads = []
+
+    def lazy():
+        for i in range(3):
+            threads.append(threading.current_thread().name)
+            yield i
+
+    async def main():
+        return [item async for item in aio.iterate(lazy())]
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert all(thread.startswith("cassiopeia-aio") for thread in threads)
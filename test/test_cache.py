@@ -0,0 +1,124 @@
+import itertools
+import time
+
+import pytest
+from datapipelines import NotFoundError
+
+from cassiopeia.core import Summoner, Match
+from cassiopeia.core.summoner import SummonerData
+from cassiopeia.core.staticdata.realm import Realms
+from cassiopeia.data import Platform
+from cassiopeia.datastores import Cache
+from cassiopeia._configuration.pipeline import CassiopeiaPipeline
+
+from .stubs import StubSource, not_found, realms
+
+
+def _pipeline(cache, *sources):
+    pipeline = CassiopeiaPipeline([cache, *sources])
+    pipeline._cache = cache
+    return pipeline
+
+
+def test_cache_max_entries_from_settings():
+    cache = Cache(max_entries={"Summoner": 10, "Match": 5})
+    assert cache._cache._max_entries == {Summoner: 10, Match: 5}
+    cache = Cache(max_entries=100, max_bytes=2 ** 20)
+    assert cache._cache._default_max_entries == 100
+    assert cache._cache._max_bytes == 2 ** 20
+
+
+def test_cache_answers_recently_not_found_queries():
+    cache = Cache(not_found_expirations={"Summoner": 0.1}, sweep_interval=0)
+    source = StubSource(get={SummonerData: not_found})
+    pipeline = _pipeline(cache, source)
+    query = {"platform": Platform.north_america, "puuid": "renamed"}
+    for _ in range(3):
+        with pytest.raises(NotFoundError):
+            pipeline.get(SummonerData, query)
+    assert source.requests == 1
+    assert cache.not_found_hits == {SummonerData: 2}
+
+    # Other queries and expired results are requested again
+    with pytest.raises(NotFoundError):
+        pipeline.get(SummonerData, dict(query, puuid="other"))
+    time.sleep(0.15)
+    with pytest.raises(NotFoundError):
+        pipeline.get(SummonerData, query)
+    assert source.requests == 3
+
+    cache.clear(SummonerData)
+    with pytest.raises(NotFoundError):
+        pipeline.get(SummonerData, query)
+    assert source.requests == 4
+
+
+def test_cache_answers_queries_that_were_not_found_once_they_are_put():
+    cache = Cache(sweep_interval=0)
+    pipeline = _pipeline(cache, StubSource(get={Summoner: not_found}))
+    query = {"platform": Platform.north_america, "puuid": "late"}
+    with pytest.raises(NotFoundError):
+        pipeline.get(Summoner, query)
+
+    summoner = Summoner._construct_normally(puuid="late", region="NA")
+    pipeline.put(Summoner, summoner)
+    assert pipeline.get(Summoner, query) is summoner
+    assert cache.not_found_hits == {}
+
+
+def test_cache_stats_count_hits_misses_and_evictions():
+    cache = Cache(max_entries={"Summoner": 1}, sweep_interval=0)
+    first = Summoner(puuid="first", region="NA")
+    cache.put(Summoner, first)
+    query = {"platform": Platform.north_america, "puuid": "first"}
+    assert cache.get(Summoner, query) is first
+    with pytest.raises(NotFoundError):
+        cache.get(Summoner, dict(query, puuid="second"))
+    cache.put(Summoner, Summoner(puuid="second", region="NA"))
+
+    stats = cache.stats()[Summoner]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["puts"] >= 2
+    assert stats["evictions"] >= 1
+    assert stats["entries"] >= 1
+    assert stats["bytes"] > 0
+    assert stats["not_found_hits"] == 0
+
+
+def test_cache_serves_stale_realms_while_revalidating():
+    cache = Cache(expirations={"Realms": 0.1}, sweep_interval=0)
+    versions = ("13.{}.1".format(i) for i in itertools.count(1))
+    source = StubSource(get={Realms: lambda query: realms(next(versions))}, delay=0.2)
+    pipeline = _pipeline(cache, source)
+    query = {"region": "NA"}
+    first = pipeline.get(Realms, query)
+    time.sleep(0.15)
+
+    start = time.monotonic()
+    assert pipeline.get(Realms, query) is first
+    assert pipeline.get(Realms, query) is first
+    assert time.monotonic() - start < 0.1
+    time.sleep(0.3)
+    assert source.requests == 2
+    assert pipeline.get(Realms, query).version == "13.2.1"
+
+
+def test_cache_snapshot_restores_entries_with_their_remaining_time(tmp_path):
+    filename = str(tmp_path / "cache.pickle")
+    cache = Cache(expirations={"Summoner": 0.2}, snapshot_file=filename)
+    summoner = Summoner(puuid="a", region="NA")
+    cache.put(Summoner, summoner)
+    cache._cache.put(str, "forever", "value")
+    cache._cache.put(str, "unpicklable", lambda: None)
+    cache.save_snapshot()
+
+    restored = Cache(sweep_interval=0, snapshot_file=filename)
+    query = {"platform": Platform.north_america, "puuid": "a"}
+    assert restored.get(Summoner, query).puuid == "a"
+    assert restored._cache.get(str, "forever") == "value"
+    assert not restored._cache.contains(str, "unpicklable")
+    time.sleep(0.25)
+    with pytest.raises(NotFoundError):
+        restored.get(Summoner, query)
+    assert restored._cache.get(str, "forever") == "value"
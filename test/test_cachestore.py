@@ -0,0 +1,139 @@
+import time
+
+import pytest
+
+from cassiopeia.datastores.cachestore import CacheStore, approximate_size
+
+
+def test_cache_store_expires_entries():
+    store = CacheStore()
+    store.put(str, "a", "value", timeout=0.05)
+    store.put(str, "b", "value", timeout=-1)
+    assert store.get(str, "a") == "value"
+    time.sleep(0.1)
+    with pytest.raises(KeyError):
+        store.get(str, "a")
+    store.expire()
+    assert len(store) == 1
+
+
+def test_cache_store_evicts_least_recently_used_entries_per_type():
+    store = CacheStore(max_entries={str: 2})
+    store.put(str, "a", "1")
+    store.put(str, "b", "2")
+    store.get(str, "a")
+    store.put(str, "c", "3")
+    assert store.contains(str, "a")
+    assert not store.contains(str, "b")
+    assert store.contains(str, "c")
+    # Other types aren't limited
+    for i in range(10):
+        store.put(int, i, i)
+    assert len(store) == 12
+
+
+def test_cache_store_evicts_to_stay_within_max_bytes():
+    value = ["x" * 1000]
+    size = approximate_size(value)
+    store = CacheStore(max_bytes=3 * size)
+    for i in range(5):
+        store.put(list, i, ["x" * 1000])
+    assert store.bytes <= 3 * size
+    assert [store.contains(list, i) for i in range(5)] == [False, False, True, True, True]
+
+
+def test_cache_store_counts_values_stored_under_several_keys_once():
+    value = {"id": 1, "name": "x" * 1000}
+    store = CacheStore(max_bytes=10 ** 6)
+    store.put(dict, "id", value)
+    store.put(dict, "name", value)
+    assert store.bytes == approximate_size(value)
+    store.delete(dict, "id")
+    assert store.bytes == approximate_size(value)
+    store.clear()
+    assert store.bytes == 0
+    assert len(store) == 0
+
+
+def test_cache_store_stores_aliased_keys_as_one_entry():
+    store = CacheStore(max_entries={"summoner": 2})
+    store.put("summoner", "puuid-1", "first", aliases=["id-1", "name-1"])
+    store.put("summoner", "puuid-2", "second", aliases=["id-2"])
+    assert len(store) == 2
+    assert store.get("summoner", "name-1") == "first"
+    assert store.stats()["summoner"]["entries"] == 2
+
+    # Putting the object again under a new alias updates its entry
+    store.put("summoner", "puuid-1", "first", aliases=["id-1", "new-name-1"])
+    assert store.get("summoner", "new-name-1") == "first"
+    assert len(store) == 2
+
+    # A name that is reused by another summoner moves to the new entry
+    store.put("summoner", "puuid-3", "third", aliases=["name-1"])
+    assert store.get("summoner", "name-1") == "third"
+    assert not store.contains("summoner", "puuid-2")  # Evicted
+
+    store.delete("summoner", "new-name-1")
+    for key in ("puuid-1", "id-1", "new-name-1"):
+        assert not store.contains("summoner", key)
+    assert len(store) == 1
+
+
+def test_cache_store_sweep_removes_expired_entries_in_batches():
+    store = CacheStore()
+    for i in range(10):
+        store.put(int, i, i, timeout=0.01 if i < 6 else -1)
+    store.put(int, 0, 0, timeout=10)  # Re-put with a later expiration
+    time.sleep(0.05)
+    assert store.sweep(max_entries=3) == 3
+    assert store.sweep() == 2
+    assert len(store) == 5
+    assert store.contains(int, 0)
+
+
+def test_cache_store_background_sweeper():
+    store = CacheStore()
+    store.start_sweeper(interval=0.02, max_entries_per_tick=10)
+    for i in range(50):
+        store.put(int, i, i, timeout=0.01)
+    deadline = time.monotonic() + 2
+    while len(store) > 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.stop_sweeper()
+    assert len(store) == 0
+
+
+def test_cache_store_compresses_cold_entries():
+    value = {"id": 1, "frames": [str(i) * 1000 for i in range(100)]}
+    store = CacheStore(max_bytes=10 ** 7, compress={dict}, hot_entries=1)
+    store.put(dict, "id", value)
+    store.put(dict, "name", value)
+    size = store.bytes
+    store.put(dict, "other", {"id": 2})
+    # The first value was compressed for both of its keys
+    assert store.bytes < size / 10
+    inflated = store.get(dict, "id")
+    assert inflated == value and inflated is not value
+    assert store.get(dict, "name") is inflated
+    # Other types aren't compressed
+    store.put(list, "a", value["frames"])
+    store.put(list, "b", [])
+    assert store.get(list, "a") is value["frames"]
+    store.clear()
+    assert store.bytes == 0
+
+
+def test_cache_store_compresses_values_only_in_the_partitions_of_compressed_types():
+    value = {"id": 1}
+    store = CacheStore(compress={"compressed"}, hot_entries=1)
+    store.put("compressed", "id", value)
+    store.put("plain", "id", value)
+    store.put("compressed", "other", {"id": 2})
+    assert store.get("plain", "id") is value
+    inflated = store.get("compressed", "id")
+    assert inflated == value and inflated is not value
+
+    store.put("compressed", "other", {"id": 3})
+    store.delete("plain", "id")
+    store.put("plain", "id", value)
+    assert store.get("plain", "id") is value
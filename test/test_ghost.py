@@ -0,0 +1,84 @@
+import pickle
+from threading import Thread
+
+import pytest
+from datapipelines import DataPipeline
+
+from cassiopeia.core import Summoner
+from cassiopeia.core.common import get_latest_version, invalidate_latest_versions
+from cassiopeia.core.summoner import SummonerData
+from cassiopeia.core.staticdata.realm import Realms
+from cassiopeia.data import Region
+from cassiopeia.datastores import Cache
+from cassiopeia._configuration.pipeline import CassiopeiaPipeline
+
+from .stubs import StubSource, realms, summoner_data
+
+
+def test_ghost_shared_between_threads_is_loaded_once(use_pipeline):
+    source = StubSource(get={SummonerData: summoner_data}, delay=0.1)
+    use_pipeline(CassiopeiaPipeline([source]))
+    summoner = Summoner._construct_normally(puuid="shared", region="NA")
+    levels = []
+    threads = [
+        Thread(target=lambda: levels.append(summoner.level)) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert levels == [30] * 5
+    assert source.requests == 1
+
+    # Copies don't share the lock
+    copy = pickle.loads(pickle.dumps(summoner))
+    assert copy.level == 30
+
+    # Loading a group that is already loaded is still an error, unless it was loaded by another thread
+    with pytest.raises(ValueError):
+        summoner.__load__(SummonerData)
+
+
+def test_ghost_isnt_locked_while_its_data_is_requested(use_pipeline):
+    summoner = Summoner._construct_normally(puuid="unlocked", region="NA")
+    acquired = []
+
+    def get(query):
+        # e.g. another thread putting the data of a load on the summoner
+        def lock():
+            acquired.append(summoner._load_lock.acquire(timeout=1))
+            summoner._load_lock.release()
+
+        thread = Thread(target=lock)
+        thread.start()
+        thread.join()
+        return summoner_data(query)
+
+    use_pipeline(DataPipeline([StubSource(get={SummonerData: get})]))
+    assert summoner.level == 30
+    assert acquired == [True]
+
+
+def test_latest_version_is_remembered_until_realms_are_cached(
+    use_pipeline, monkeypatch
+):
+    source = StubSource(get={Realms: lambda query: realms()})
+    cache = Cache(sweep_interval=0)
+    pipeline = use_pipeline(CassiopeiaPipeline([cache, source]))
+    pipeline._cache = cache
+    requests = []
+    get = pipeline.get
+    monkeypatch.setattr(
+        pipeline, "get", lambda type, query: requests.append(type) or get(type, query)
+    )
+    invalidate_latest_versions()
+
+    assert get_latest_version("NA", None) == "13.1.1"
+    assert get_latest_version(Region.north_america, None) == "13.1.1"
+    assert requests == [Realms]
+
+    cache.put(Realms, realms("14.1.1"))
+    assert get_latest_version("NA", None) == "14.1.1"
+    assert requests == [Realms, Realms]
+    assert source.requests == 1
+    invalidate_latest_versions()
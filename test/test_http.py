@@ -0,0 +1,52 @@
+import time
+
+from cassiopeia.datastores.common import ConnectionPool
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_reused_per_host():
+    pool = ConnectionPool(FakeConnection)
+    with pool.connection("https://na1.api.riotgames.com/lol/a") as first:
+        pass
+    with pool.connection("https://na1.api.riotgames.com/lol/b") as second:
+        assert second is first
+    with pool.connection("https://euw1.api.riotgames.com/lol/a") as other:
+        assert other is not first
+
+
+def test_concurrent_checkouts_get_separate_connections():
+    pool = ConnectionPool(FakeConnection, max_connections_per_host=1)
+    with pool.connection("https://na1.api.riotgames.com/") as first:
+        with pool.connection("https://na1.api.riotgames.com/") as second:
+            assert first is not second
+    # Only one idle connection is kept for the host
+    assert first.closed != second.closed
+
+
+def test_idle_connections_are_evicted():
+    pool = ConnectionPool(FakeConnection, idle_timeout=0.01)
+    with pool.connection("https://ddragon.leagueoflegends.com/") as first:
+        pass
+    time.sleep(0.02)
+    with pool.connection("https://ddragon.leagueoflegends.com/") as second:
+        assert second is not first
+    assert first.closed
+
+
+def test_failed_connections_are_not_reused():
+    pool = ConnectionPool(FakeConnection)
+    try:
+        with pool.connection("https://na1.api.riotgames.com/") as first:
+            raise ConnectionError
+    except ConnectionError:
+        pass
+    assert first.closed
+    with pool.connection("https://na1.api.riotgames.com/") as second:
+        assert second is not first
@@ -0,0 +1,191 @@
+import contextvars
+import time
+from threading import Thread
+
+import pytest
+from datapipelines import NotFoundError
+
+from cassiopeia.core import Summoner
+from cassiopeia.core.staticdata.realm import Realms
+from cassiopeia.data import Platform
+from cassiopeia.datastores import Cache
+from cassiopeia._configuration.pipeline import CassiopeiaPipeline
+
+from .stubs import StubSource, not_found, realms
+
+
+def _summoners(unknown=(), reverse=False):
+    def get_many(query):
+        puuids = reversed(query["puuids"]) if reverse else query["puuids"]
+        return (
+            Summoner(puuid=puuid, region="NA")
+            for puuid in puuids
+            if puuid not in unknown
+        )
+
+    return StubSource(get_many={Summoner: get_many})
+
+
+def _slow_realms():
+    def get(query):
+        if query["region"] == "KR":
+            not_found(query)
+        return realms()
+
+    return StubSource(get={Realms: get}, delay=0.2)
+
+
+def _run_in_threads(*targets):
+    threads = [Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_pipeline_get_many_only_requests_missing_items():
+    cache = Cache(sweep_interval=0)
+    source = _summoners()
+    pipeline = CassiopeiaPipeline([cache, source])
+    pipeline._cache = cache
+    cached = {puuid: Summoner(puuid=puuid, region="NA") for puuid in ("a", "c")}
+    for summoner in cached.values():
+        cache.put(Summoner, summoner)
+
+    query = {"platform": Platform.north_america, "puuids": ["a", "b", "c", "d"]}
+    summoners = pipeline.get_many(Summoner, query)
+    assert [summoner.puuid for summoner in summoners] == ["a", "b", "c", "d"]
+    assert summoners[0] is cached["a"] and summoners[2] is cached["c"]
+    assert [query["puuids"] for query in source.queries] == [["b", "d"]]
+
+    # The requested summoners were put in the cache on the way back
+    summoners = list(pipeline.get_many(Summoner, query, streaming=True))
+    assert [summoner.puuid for summoner in summoners] == ["a", "b", "c", "d"]
+    assert source.requests == 1
+
+
+def test_pipeline_get_many_keeps_the_requested_order_of_unordered_sources():
+    cache = Cache(sweep_interval=0)
+    pipeline = CassiopeiaPipeline([cache, _summoners(reverse=True)])
+    pipeline._cache = cache
+    cache.put(Summoner, Summoner(puuid="b", region="NA"))
+
+    query = {"platform": Platform.north_america, "puuids": ["a", "b", "c", "d"]}
+    for streaming in (False, True):
+        summoners = pipeline.get_many(Summoner, dict(query), streaming=streaming)
+        assert [summoner.puuid for summoner in summoners] == ["a", "b", "c", "d"]
+        cache.clear(Summoner)
+        cache.put(Summoner, Summoner(puuid="b", region="NA"))
+
+
+def test_pipeline_get_many_raises_not_found_for_missing_results():
+    cache = Cache(sweep_interval=0)
+    pipeline = CassiopeiaPipeline([cache, _summoners(unknown=("d",))])
+    pipeline._cache = cache
+    cache.put(Summoner, Summoner(puuid="a", region="NA"))
+
+    query = {"platform": Platform.north_america, "puuids": ["a", "b", "d"]}
+    with pytest.raises(NotFoundError):
+        pipeline.get_many(Summoner, query)
+    summoners = pipeline.get_many(Summoner, query, streaming=True)
+    with pytest.raises(NotFoundError):
+        list(summoners)
+
+
+def test_pipeline_shares_concurrent_identical_requests():
+    source = _slow_realms()
+    pipeline = CassiopeiaPipeline([source])
+    results = []
+
+    def get(region):
+        return lambda: results.append(pipeline.get(Realms, {"region": region}))
+
+    _run_in_threads(*[get("NA") for _ in range(5)], get("EUW"))
+    assert source.requests == 2
+    assert len({id(result) for result in results}) == 2
+
+
+def test_pipeline_shares_errors_of_concurrent_identical_requests():
+    source = _slow_realms()
+    pipeline = CassiopeiaPipeline([source])
+    errors = []
+
+    def get():
+        try:
+            pipeline.get(Realms, {"region": "KR"})
+        except NotFoundError as error:
+            errors.append(error)
+
+    _run_in_threads(get, get, get)
+    assert source.requests == 1
+    assert len({id(error) for error in errors}) == 3
+    (original,) = [error for error in errors if error.__cause__ is None]
+    assert all(error.__cause__ in (None, original) for error in errors)
+    assert len({str(error) for error in errors}) == 1
+
+
+def test_pipeline_stops_waiting_for_identical_requests_after_a_timeout():
+    source = _slow_realms()
+    pipeline = CassiopeiaPipeline([source])
+    pipeline.identical_request_timeout = 0.05
+    _run_in_threads(*[lambda: pipeline.get(Realms, {"region": "NA"})] * 3)
+    assert source.requests == 3
+
+
+def test_pipeline_doesnt_wait_for_requests_of_its_own_context_in_other_threads():
+    query = {"region": "NA"}
+
+    def get(query):
+        # e.g. a transformer that hands the request to a worker thread with a copy of its context
+        if source.requests > 1:
+            return realms()
+        results = []
+        context = contextvars.copy_context()
+        thread = Thread(
+            target=lambda: results.append(context.run(pipeline.get, Realms, query))
+        )
+        thread.start()
+        thread.join()
+        return results[0]
+
+    source = StubSource(get={Realms: get})
+    pipeline = CassiopeiaPipeline([source])
+    start = time.monotonic()
+    assert pipeline.get(Realms, query).version == "13.1.1"
+    assert time.monotonic() - start < pipeline.identical_request_timeout / 2
+    assert source.requests == 2
+
+
+def test_pipeline_routes_are_kept_for_get_and_put():
+    cache = Cache(sweep_interval=0)
+    pipeline = CassiopeiaPipeline([cache])
+    pipeline._cache = cache
+    pipeline.precompute_routes()
+    assert pipeline._source_routes[Summoner][0].source is cache
+
+    summoner = Summoner._construct_normally(puuid="put", region="NA")
+    pipeline.put(Summoner, summoner)
+    query = {"platform": Platform.north_america, "puuid": "put"}
+    assert pipeline.get(Summoner, query) is summoner
+
+
+def test_pipeline_falls_back_to_datapipelines_without_its_internals(monkeypatch):
+    from cassiopeia._configuration import pipeline as module
+
+    def changed_handler(handler, *args):
+        return handler._renamed
+
+    monkeypatch.setattr(module, "_source_route", changed_handler)
+    monkeypatch.setattr(module, "_sink_route", changed_handler)
+    cache = Cache(sweep_interval=0)
+    source = StubSource(get={Realms: lambda query: realms()})
+    pipeline = CassiopeiaPipeline([cache, source])
+    pipeline._cache = cache
+    pipeline.precompute_routes()
+    assert not pipeline._use_routes
+
+    assert pipeline.get(Realms, {"region": "NA"}).version == "13.1.1"
+    summoner = Summoner._construct_normally(puuid="put", region="NA")
+    pipeline.put(Summoner, summoner)
+    query = {"platform": Platform.north_america, "puuid": "put"}
+    assert cache.get(Summoner, query) is summoner
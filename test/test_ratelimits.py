@@ -0,0 +1,261 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from cassiopeia.datastores.riotapi.common import RiotAPIRateLimiter
+from cassiopeia.datastores.riotapi.ratelimits import (
+    request_priority,
+    SynchronizedFixedWindowRateLimiter,
+    SlidingWindowRateLimiter,
+    GCRARateLimiter,
+    SharedSlidingWindowRateLimiter,
+    _BlockingRateLimiter,
+)
+
+
+def _elapsed_for(limiter, permits):
+    start = time.monotonic()
+    for _ in range(permits):
+        with limiter:
+            pass
+    return time.monotonic() - start
+
+
+def test_sliding_window_blocks_until_the_oldest_permit_expires():
+    limiter = SlidingWindowRateLimiter(window_seconds=0.2, window_permits=3)
+    assert _elapsed_for(limiter, 3) < 0.1
+    assert _elapsed_for(limiter, 1) >= 0.15
+    assert limiter.permits_issued == 4
+
+
+def test_sliding_window_reconcile_counts_permits_used_elsewhere():
+    limiter = SlidingWindowRateLimiter(window_seconds=0.2, window_permits=3)
+    with limiter:
+        pass
+    limiter.reconcile(3)
+    assert _elapsed_for(limiter, 1) >= 0.15
+
+
+def test_sliding_window_restrict_for():
+    limiter = SlidingWindowRateLimiter(window_seconds=10, window_permits=100)
+    limiter.restrict_for(0.2)
+    assert _elapsed_for(limiter, 1) >= 0.15
+
+
+def test_sliding_window_timeout():
+    limiter = SlidingWindowRateLimiter(window_seconds=10, window_permits=1, timeout=0.05)
+    with limiter:
+        pass
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+
+
+def test_fixed_window_reconcile_drains_permits_used_elsewhere():
+    limiter = SynchronizedFixedWindowRateLimiter(
+        window_seconds=0.3, window_permits=5, timeout=0.05
+    )
+    limiter.reconcile(4)
+    with limiter:
+        pass
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+    # The drained permits come back when the window ends
+    time.sleep(0.4)
+    assert _elapsed_for(limiter, 5) < 0.1
+
+
+def test_fixed_window_reconcile_resynchronizes_window_phase():
+    limiter = SynchronizedFixedWindowRateLimiter(window_seconds=0.3, window_permits=2)
+    assert _elapsed_for(limiter, 2) < 0.1
+    # The server started a new window with this request, so one permit is left in it
+    limiter.reconcile(1)
+    assert _elapsed_for(limiter, 1) < 0.1
+    assert _elapsed_for(limiter, 1) >= 0.2
+
+
+def test_incomplete_strategies_cannot_be_instantiated():
+    class Incomplete(_BlockingRateLimiter):
+        def _wait_time(self, now):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete(window_seconds=1, window_permits=1)
+
+
+def test_gcra_spaces_requests():
+    limiter = GCRARateLimiter(window_seconds=0.4, window_permits=4)
+    # One request immediately, then one every 0.1 seconds
+    assert 0.25 <= _elapsed_for(limiter, 4) < 0.4
+
+
+def test_gcra_burst():
+    limiter = GCRARateLimiter(window_seconds=1, window_permits=10, burst_fraction=0.5)
+    assert _elapsed_for(limiter, 5) < 0.1
+
+
+def test_gcra_reconcile_counts_permits_used_elsewhere():
+    limiter = GCRARateLimiter(window_seconds=0.4, window_permits=4)
+    limiter.reconcile(4)
+    assert _elapsed_for(limiter, 1) >= 0.35
+
+
+def test_gcra_reaches_the_limit_when_reconciled_after_every_request():
+    limiter = GCRARateLimiter(window_seconds=0.5, window_permits=10)
+    # The server counts requests in fixed windows and reports the count of the current one with each response
+    start = time.monotonic()
+    server_window, server_count, requests = 0, 0, 0
+    while time.monotonic() - start < 1.0:
+        with limiter:
+            window = int((time.monotonic() - start) / 0.5)
+            if window != server_window:
+                server_window, server_count = window, 0
+            server_count += 1
+        requests += 1
+        limiter.reconcile(server_count)
+    assert requests >= 18
+
+
+def test_riot_api_rate_limiter_uses_strategy():
+    limiter = RiotAPIRateLimiter(limiting_share=0.5, strategy="sliding_window")
+    limiter.adjust_rate_limits_if_necessary([(20, 1), (100, 120)])
+    assert all(isinstance(l, SlidingWindowRateLimiter) for l in limiter._limiters)
+    assert limiter._get_specific_limiter_for_window(120)._window_permits == 50
+
+    copy = limiter.empty_copy()
+    assert copy.strategy == "sliding_window"
+    assert copy.limiting_share == 0.5
+    assert len(copy) == 0
+
+    with pytest.raises(ValueError):
+        RiotAPIRateLimiter(limiting_share=1.0, strategy="unknown")
+
+
+def _take_shared_permits(directory, permits):
+    limiter = SharedSlidingWindowRateLimiter(
+        window_seconds=10, window_permits=5, name="NA1-matches_id", directory=directory
+    )
+    for _ in range(permits):
+        with limiter:
+            pass
+
+
+def test_shared_sliding_window_is_shared_between_processes(tmp_path):
+    process = multiprocessing.get_context("spawn").Process(
+        target=_take_shared_permits, args=(str(tmp_path), 4)
+    )
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+    limiter = SharedSlidingWindowRateLimiter(
+        window_seconds=10,
+        window_permits=5,
+        name="NA1-matches_id",
+        directory=str(tmp_path),
+        timeout=0.1,
+    )
+    with limiter:
+        pass
+    with pytest.raises(TimeoutError):
+        with limiter:
+            pass
+
+
+def test_shared_sliding_window_expires_and_grows(tmp_path):
+    first = SharedSlidingWindowRateLimiter(
+        window_seconds=0.2, window_permits=2, name="application", directory=str(tmp_path)
+    )
+    second = SharedSlidingWindowRateLimiter(
+        window_seconds=0.2, window_permits=2, name="application", directory=str(tmp_path)
+    )
+    assert _elapsed_for(first, 2) < 0.1
+    assert _elapsed_for(second, 1) >= 0.15
+    second.set_permits(4)
+    assert _elapsed_for(second, 3) < 0.1
+    first.restrict_for(0.2)
+    assert _elapsed_for(second, 1) >= 0.15
+
+
+def test_riot_api_rate_limiter_reconciles_counts_on_cold_start():
+    limiter = RiotAPIRateLimiter(limiting_share=1.0)
+    limiter.adjust_rate_limits_if_necessary([(20, 1), (100, 120)])
+    limiter.reconcile_counts([(3, 1), (99, 120)])
+    assert limiter._get_specific_limiter_for_window(120)._permitter._permits == 1
+    assert limiter._get_specific_limiter_for_window(1)._permitter._permits == 17
+
+
+def test_riot_api_rate_limiter_reconciles_only_its_share_of_other_clients_counts():
+    limiter = RiotAPIRateLimiter(limiting_share=0.5)
+    limiter.adjust_rate_limits_if_necessary([(100, 120)])
+    # 60 requests counted by the server, of which only this process's half of the other 59 is charged
+    limiter.reconcile_counts([(60, 120)])
+    assert limiter._get_specific_limiter_for_window(120)._permitter._permits == 19
+
+    limiter = RiotAPIRateLimiter(limiting_share=0.5, strategy="sliding_window")
+    limiter.adjust_rate_limits_if_necessary([(100, 120)])
+    limiter.reconcile_counts([(60, 120)])
+    assert limiter._get_specific_limiter_for_window(120).usage()[0] == 31
+
+
+def test_riot_api_rate_limiter_names_shared_limiters(tmp_path):
+    limiter = RiotAPIRateLimiter(
+        limiting_share=1.0,
+        strategy="shared_sliding_window",
+        name="NA1-application",
+        directory=str(tmp_path),
+    )
+    method_limiter = limiter.empty_copy(name="NA1-matches/id")
+    method_limiter.adjust_rate_limits_if_necessary([(2000, 10)])
+    assert (tmp_path / "NA1-matches_id-10s.bin").exists()
+
+
+def test_shared_sliding_window_reconciles_only_its_share_of_other_clients_counts(
+    tmp_path,
+):
+    limiters = [
+        RiotAPIRateLimiter(
+            limiting_share=0.5,
+            strategy="shared_sliding_window",
+            name="NA1-application",
+            directory=str(tmp_path),
+        )
+        for _ in range(2)
+    ]
+    for limiter, permits in zip(limiters, (4, 2)):
+        limiter.adjust_rate_limits_if_necessary([(20, 10)])
+        _elapsed_for(limiter._limiters[0], permits)
+    # The server also counted 6 requests from a client that isn't sharing the log
+    limiters[0].reconcile_counts([(12, 10)])
+    assert limiters[1]._limiters[0].usage()[0] == 7
+
+
+def test_high_priority_requests_jump_the_queue():
+    limiter = RiotAPIRateLimiter(limiting_share=1.0, strategy="sliding_window")
+    limiter.adjust_rate_limits_if_necessary([(1, 0.1)])
+    order = []
+
+    def request(name, priority):
+        with request_priority(priority):
+            with limiter:
+                order.append(name)
+
+    with limiter:
+        pass
+    threads = [
+        threading.Thread(target=request, args=("crawl", 0)) for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    while limiter._gate.waiting < 2:
+        time.sleep(0.01)
+    interactive = threading.Thread(target=request, args=("interactive", 10))
+    interactive.start()
+    threads.append(interactive)
+    for thread in threads:
+        thread.join()
+    # One crawl request was already waiting on the limiter; the interactive one goes next
+    assert order == ["crawl", "interactive", "crawl", "crawl"]
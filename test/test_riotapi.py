@@ -0,0 +1,270 @@
+import gc
+import itertools
+import threading
+import time
+
+import pytest
+
+from cassiopeia import Platform
+from cassiopeia.data import Continent
+from cassiopeia.datastores.common import HTTPError
+from cassiopeia.datastores.riotapi.common import (
+    RiotAPIRateLimiter,
+    RetryScheduler,
+    APIError,
+)
+from cassiopeia.datastores.riotapi import RiotAPI
+from cassiopeia.datastores.riotapi.match import MatchAPI
+from cassiopeia.dto.match import MatchDto
+
+
+def _app_rate_limiter():
+    return {
+        platform: RiotAPIRateLimiter(limiting_share=1.0)
+        for platform in itertools.chain(Platform, Continent)
+    }
+
+
+def _match_api(**kwargs):
+    return MatchAPI("RGAPI-test", app_rate_limiter=_app_rate_limiter(), **kwargs)
+
+
+def _fake_match_dto(in_flight, delays):
+    lock = threading.Lock()
+    current = [0]
+
+    def get_match_dto(platform, id):
+        with lock:
+            current[0] += 1
+            in_flight.append(current[0])
+        time.sleep(delays.get(id, 0.01))
+        with lock:
+            current[0] -= 1
+        return MatchDto({"matchId": id})
+
+    return get_match_dto
+
+
+def test_get_many_match_concurrent_in_order():
+    api = _match_api(max_concurrent_requests=4)
+    in_flight = []
+    api._get_match_dto = _fake_match_dto(in_flight, {1: 0.1})
+    ids = list(range(1, 13))
+    matches = api.get_many(MatchDto, {"platform": Platform.north_america, "ids": ids})
+    assert [match["matchId"] for match in matches] == ids
+    assert 1 < max(in_flight) <= 4
+
+
+def test_get_many_match_concurrent_as_completed():
+    api = _match_api(max_concurrent_requests=4, ordered_results=False)
+    api._get_match_dto = _fake_match_dto([], {1: 0.2})
+    ids = [1, 2, 3, 4]
+    matches = api.get_many(MatchDto, {"platform": Platform.north_america, "ids": ids})
+    ids_returned = [match["matchId"] for match in matches]
+    assert sorted(ids_returned) == ids
+    assert ids_returned[-1] == 1
+
+
+def test_get_many_match_sequential_by_default():
+    api = _match_api()
+    in_flight = []
+    api._get_match_dto = _fake_match_dto(in_flight, {})
+    ids = [1, 2, 3]
+    matches = api.get_many(MatchDto, {"platform": Platform.north_america, "ids": ids})
+    assert [match["matchId"] for match in matches] == ids
+    assert max(in_flight) == 1
+
+
+def test_get_many_match_threads_are_shut_down_on_close():
+    api = _match_api(max_concurrent_requests=2)
+    api._get_match_dto = _fake_match_dto([], {})
+    query = {"platform": Platform.north_america, "ids": [1, 2, 3]}
+    assert len(list(api.get_many(MatchDto, query))) == 3
+    executor = api._executor
+    api.close()
+    assert executor._shutdown and api._executor is None
+
+    # Requests after closing start new threads
+    assert len(list(api.get_many(MatchDto, query))) == 3
+    executor = api._executor
+    del api
+    gc.collect()
+    assert executor._shutdown
+
+
+_FAST_BACKOFF = {
+    "504": {
+        "strategy": "exponential_backoff",
+        "initial_backoff": 0.3,
+        "backoff_factor": 2.0,
+        "max_attempts": 2,
+    }
+}
+
+
+class FakeClient(object):
+    # Fails each match id in `failures` with a 504 the given number of times before returning it
+    def __init__(self, failures, delay=0.05):
+        self.failures = dict(failures)
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight_while_retrying = 0
+        self._lock = threading.Lock()
+
+    def get(
+        self, url, parameters=None, headers=None, rate_limiters=None, connection=None
+    ):
+        id = int(url.rsplit("_", 1)[1])
+        with self._lock:
+            self.calls.append(id)
+            if self.failures.get(id, 0) > 0:
+                self.failures[id] -= 1
+                raise HTTPError("Gateway Timeout", 504)
+            self.in_flight += 1
+        time.sleep(self.delay)
+        with self._lock:
+            if any(self.calls.count(i) == 1 for i in self.failures):
+                # One of the failing requests is waiting to be retried
+                self.max_in_flight_while_retrying = max(
+                    self.max_in_flight_while_retrying, self.in_flight
+                )
+            self.in_flight -= 1
+        return {"info": {"participants": []}}, {}
+
+
+def test_get_many_match_parks_requests_waiting_to_be_retried():
+    client = FakeClient({1: 1})
+    api = _match_api(
+        max_concurrent_requests=2,
+        ordered_results=False,
+        http_client=client,
+        request_error_handling=dict(_FAST_BACKOFF),
+    )
+    ids = [1, 2, 3, 4, 5, 6]
+    matches = api.get_many(MatchDto, {"platform": Platform.north_america, "ids": ids})
+    ids_returned = [match["matchId"] for match in matches]
+    assert sorted(ids_returned) == ids
+    assert ids_returned[-1] == 1
+    assert client.calls.count(1) == 2
+    # Both workers kept making requests while the failed one waited
+    assert client.max_in_flight_while_retrying == 2
+
+
+def test_get_many_match_raises_errors_of_parked_requests_that_cant_resume():
+    api = _match_api(
+        max_concurrent_requests=2,
+        http_client=FakeClient({1: 1}),
+        request_error_handling=dict(_FAST_BACKOFF),
+    )
+
+    class ShutDownScheduler(RetryScheduler):
+        def schedule(self, delay, callback):
+            api._executor.shutdown(wait=False)
+            super().schedule(delay, callback)
+
+    api._retry_scheduler = ShutDownScheduler()
+    errors = []
+
+    def get_matches():
+        query = {"platform": Platform.north_america, "ids": [1]}
+        try:
+            list(api.get_many(MatchDto, query))
+        except RuntimeError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=get_matches, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
+def test_get_match_retries_in_the_calling_thread():
+    client = FakeClient({1: 1}, delay=0)
+    api = _match_api(http_client=client, request_error_handling=dict(_FAST_BACKOFF))
+    match = api.get(MatchDto, {"platform": Platform.north_america, "id": 1})
+    assert match["matchId"] == 1
+    assert client.calls == [1, 1]
+
+
+def test_retry_budget_limits_retries_per_endpoint():
+    client = FakeClient({1: 1, 2: 1}, delay=0)
+    api = _match_api(
+        http_client=client,
+        request_error_handling=dict(_FAST_BACKOFF),
+        retry_budget={"max_retries": 1, "window_seconds": 10},
+    )
+    api.get(MatchDto, {"platform": Platform.north_america, "id": 1})
+    with pytest.raises(APIError):
+        api.get(MatchDto, {"platform": Platform.north_america, "id": 2})
+    assert client.calls == [1, 1, 2]
+
+
+def test_retry_scheduler_runs_callbacks_in_due_order():
+    scheduler = RetryScheduler()
+    ran = []
+    done = threading.Event()
+    scheduler.schedule(0.2, lambda: (ran.append("late"), done.set()))
+    scheduler.schedule(0.05, lambda: ran.append("early"))
+    assert done.wait(2)
+    assert ran == ["early", "late"]
+
+
+def _riotapi_match_service(riotapi):
+    return next(
+        service for service in riotapi._services() if isinstance(service, MatchAPI)
+    )
+
+
+def test_rate_limiter_state_is_restored_after_a_restart(tmp_path):
+    filename = str(tmp_path / "ratelimits.json")
+    riotapi = RiotAPI(
+        "RGAPI-test",
+        rate_limiter={"strategy": "sliding_window"},
+        rate_limiter_state_file=filename,
+    )
+    service = _riotapi_match_service(riotapi)
+    app_limiter, method_limiter = service._get_rate_limiter(
+        Continent.americas, "matches/id"
+    )
+    service._adjust_rate_limiters_from_headers(
+        app_limiter,
+        method_limiter,
+        {
+            "X-App-Rate-Limit": "20:1,100:120",
+            "X-App-Rate-Limit-Count": "1:1,40:120",
+            "X-Method-Rate-Limit": "2000:10",
+            "X-Method-Rate-Limit-Count": "5:10",
+        },
+    )
+    method_limiter.restrict_for(30)
+    riotapi.save_rate_limiter_state()
+
+    restarted = RiotAPI(
+        "RGAPI-test",
+        rate_limiter={"strategy": "sliding_window"},
+        rate_limiter_state_file=filename,
+    )
+    service = _riotapi_match_service(restarted)
+    app_limiter, method_limiter = service._get_rate_limiter(
+        Continent.americas, "matches/id"
+    )
+    assert app_limiter._get_specific_limiter_for_window(120).usage()[0] == 40
+    used, restricted_for = method_limiter._get_specific_limiter_for_window(10).usage()
+    assert 25 < restricted_for <= 30
+    assert len(method_limiter) == 1
+
+
+def test_method_limiters_start_with_the_known_rate_limits():
+    api = _match_api()
+    _, method_limiter = api._get_rate_limiter(Continent.americas, "matches/id")
+    assert method_limiter._get_specific_limiter_for_window(10)._window_permits == 2000
+
+    api = _match_api(
+        method_rate_limits={"matches/id": [[100, 10]], "matches/id/timeline": None}
+    )
+    _, method_limiter = api._get_rate_limiter(Continent.americas, "matches/id")
+    assert method_limiter._get_specific_limiter_for_window(10)._window_permits == 100
+    _, method_limiter = api._get_rate_limiter(Continent.americas, "matches/id/timeline")
+    assert len(method_limiter) == 0
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+from datapipelines import NotFoundError
+
+from cassiopeia.data import Platform, Queue
+from cassiopeia.datastores import SQLiteStore
+from cassiopeia.dto.match import MatchDto
+from cassiopeia.dto.summoner import SummonerDto
+from cassiopeia.dto.staticdata.champion import ChampionListDto
+from cassiopeia.dto.staticdata.version import VersionListDto
+
+
+def _match(id, puuids, queue=420, creation=1000):
+    return MatchDto(
+        {
+            "matchId": id,
+            "platformId": "NA1",
+            "continent": "AMERICAS",
+            "queueId": queue,
+            "gameCreation": creation,
+            "participants": [{"puuid": puuid, "bot": False} for puuid in puuids],
+        }
+    )
+
+
+def test_sqlite_store_round_trips_matches(tmp_path):
+    store = SQLiteStore(path=str(tmp_path / "cass.sqlite"), batch_size=2)
+    store.put_many(MatchDto, (_match(id, ["a", "b"], creation=id) for id in range(5)))
+    match = store.get(MatchDto, {"region": "NA", "id": 3})
+    assert isinstance(match, MatchDto)
+    assert match == _match(3, ["a", "b"], creation=3)
+    with pytest.raises(NotFoundError):
+        store.get(MatchDto, {"platform": Platform.korea, "id": 3})
+    assert [id for _, id in store.match_ids("a", start_time=2)] == [4, 3, 2]
+    assert store.match_ids("c") == []
+
+    matches = store.get_many(MatchDto, {"platform": "NA1", "ids": [1, 2]})
+    assert [match["matchId"] for match in matches] == [1, 2]
+    with pytest.raises(NotFoundError):
+        store.get_many(MatchDto, {"platform": "NA1", "ids": [1, 10]})
+
+    # The data is still there when the database is reopened
+    store.close()
+    reopened = SQLiteStore(path=str(tmp_path / "cass.sqlite"))
+    assert reopened.match_ids("b", queue=Queue.ranked_solo_fives)[0] == (
+        Platform.north_america,
+        4,
+    )
+
+
+def test_sqlite_store_finds_summoners_by_any_id_and_expires_them(tmp_path):
+    store = SQLiteStore(
+        path=str(tmp_path / "cass.sqlite"), expirations={"SummonerDto": 0.1}
+    )
+    summoner = SummonerDto(
+        region="NA", puuid="p", id="i", accountId="a", name="Some Name"
+    )
+    store.put(SummonerDto, summoner)
+    for query in (
+        {"puuid": "p"},
+        {"id": "i"},
+        {"accountId": "a"},
+        {"name": "some name"},
+    ):
+        assert store.get(SummonerDto, dict(query, platform="NA1")) == summoner
+    time.sleep(0.15)
+    with pytest.raises(NotFoundError):
+        store.get(SummonerDto, {"platform": "NA1", "puuid": "p"})
+    store.expire(SummonerDto)
+    count = store._connection().execute("SELECT COUNT(*) FROM summoners").fetchone()
+    assert count == (0,)
+
+
+def test_sqlite_store_keys_static_data_by_version_and_locale(tmp_path):
+    store = SQLiteStore(path=str(tmp_path / "cass.sqlite"))
+    champions = ChampionListDto(
+        region="NA", version="13.1.1", locale="en_US", includedData={"all"}, data={}
+    )
+    store.put(ChampionListDto, champions)
+    store.put(VersionListDto, VersionListDto(region="NA", versions=["13.1.1"]))
+    query = {"platform": "NA1", "version": "13.1.1", "includedData": {"all"}}
+    assert store.get(ChampionListDto, query) == champions
+    with pytest.raises(NotFoundError):
+        store.get(ChampionListDto, dict(query, version="13.2.1"))
+    with pytest.raises(NotFoundError):
+        store.get(ChampionListDto, dict(query, locale="ko_KR"))
+    assert store.get(VersionListDto, {"region": "NA"})["versions"] == ["13.1.1"]
+    store.clear(ChampionListDto)
+    with pytest.raises(NotFoundError):
+        store.get(ChampionListDto, query)
+    assert store.get(VersionListDto, {"region": "NA"})["versions"] == ["13.1.1"]
+
+
+def test_sqlite_store_can_be_used_from_several_threads(tmp_path):
+    store = SQLiteStore(path=str(tmp_path / "cass.sqlite"))
+    errors = []
+
+    def write(first):
+        try:
+            matches = (_match(id, ["a"]) for id in range(first, first + 50))
+            store.put_many(MatchDto, matches)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(store.match_ids("a")) == 200
@@ -0,0 +1,67 @@
+import pytest
+from datapipelines import NotFoundError
+
+from cassiopeia import tracing
+from cassiopeia.core.staticdata.realm import Realms
+from cassiopeia.datastores import Cache
+from cassiopeia._configuration.pipeline import CassiopeiaPipeline
+
+from .stubs import StubSource, not_found, realms
+
+
+def _realms(query):
+    if query["region"] != "NA":
+        not_found(query)
+    return realms()
+
+
+@pytest.fixture
+def collector():
+    collector = tracing.SpanCollector()
+    tracing.set_exporter(collector)
+    yield collector
+    tracing.set_exporter(None)
+
+
+def test_no_spans_without_an_exporter():
+    assert tracing.get_exporter() is None
+    with tracing.span("nothing", key="value") as span:
+        span.set("status", 200)
+    assert not isinstance(span, tracing.Span)
+
+
+def test_pipeline_spans(collector):
+    cache = Cache(sweep_interval=0)
+    pipeline = CassiopeiaPipeline([cache, StubSource(get={Realms: _realms})])
+    pipeline._cache = cache
+    pipeline.get(Realms, {"region": "NA"})
+
+    (root,) = collector.spans
+    assert root.name == "get"
+    assert root.attributes == {"type": "Realms"}
+    sources = [child for child in root.children if child.name == "source"]
+    assert [source.attributes["source"] for source in sources] == [
+        "Cache",
+        "StubSource",
+    ]
+    assert sources[0].attributes["error"] == "NotFoundError"
+    assert [child.attributes["sink"] for child in root.children[2:]] == ["Cache"]
+    assert all(child.end <= root.end for _, child in root.walk())
+    assert "get" in tracing.format_span(root).splitlines()[0]
+
+    collector.clear()
+    with pytest.raises(NotFoundError):
+        pipeline.get(Realms, {"region": "EUW"})
+    assert collector.spans[0].attributes["error"] == "NotFoundError"
+
+
+def test_failing_exporter_does_not_fail_requests():
+    def exporter(span):
+        raise RuntimeError
+
+    tracing.set_exporter(exporter)
+    try:
+        with tracing.span("request"):
+            pass
+    finally:
+        tracing.set_exporter(None)